@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark of the memory retained by received messages.
+
+Compares the slotted message models with unslotted equivalents of the same
+attributes, as the models were before they used slots.
+"""
+import copy
+import gc
+import json
+import pickle
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import attr
+
+from semaphore import LazyMessage, Message
+
+COUNT = 10000
+
+ENVELOPE = {
+    "account": "+31600000000", "type": "CIPHERTEXT", "timestamp": 1672531200000,
+    "server_receiver_timestamp": 1672531200100, "source_device": 1,
+    "unidentified_sender": True,
+    "source": {"uuid": "1bd6f1e2-4c2b-4d5e-8f1a-3c9b2e7d6a10", "number": "+31611111111"},
+    "data_message": {
+        "timestamp": 1672531200000, "body": "!remind 10 water the plants",
+        "groupV2": {"id": "EdSqI90cS0UomDpgUXOlCoObWvQOXlH5G3Z2d3f4ayE=", "revision": 42},
+        "mentions": [
+            {"length": 1, "start": 0, "uuid": "2c7e0f3a-5d3c-4e6f-9a2b-4d0c3f8e7b21"}
+        ],
+        "attachments": [{"contentType": "image/jpeg", "id": "8jD7Qm2Lq0", "size": 48213,
+                         "width": 1024, "height": 768}],
+    },
+}
+
+_unslotted: Dict[type, type] = {}
+
+
+def unslotted(obj: Any) -> Any:
+    """Copy a model tree to unslotted classes with the same attributes."""
+    if isinstance(obj, list):
+        return [unslotted(item) for item in obj]
+    if not attr.has(type(obj)):
+        return obj
+
+    cls = type(obj)
+    if cls not in _unslotted:
+        _unslotted[cls] = attr.make_class(
+            cls.__name__, [field.name for field in attr.fields(cls)], slots=False
+        )
+    return _unslotted[cls](*[unslotted(getattr(obj, field.name))
+                             for field in attr.fields(cls)])
+
+
+def retained(create: Callable[[Dict], Any]) -> float:
+    """Measure the bytes retained per message received as a JSON envelope."""
+    lines = [json.dumps(ENVELOPE).encode() for _ in range(COUNT)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages: List[Any] = [create(json.loads(line)) for line in lines]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del messages
+    return size / COUNT
+
+
+def main() -> None:
+    def slotted(envelope: Dict) -> Message:
+        return Message.create_from_receive_dict(envelope, None)  # type: ignore[arg-type]
+
+    assert attr.asdict(unslotted(slotted(ENVELOPE)), recurse=True) == \
+        attr.asdict(slotted(ENVELOPE), recurse=True)
+
+    # Slotted lazy messages can still be copied and pickled.
+    lazy = LazyMessage(ENVELOPE, None)  # type: ignore[arg-type]
+    for message in (lazy, slotted(ENVELOPE)):
+        assert copy.copy(message) == message
+        assert pickle.loads(pickle.dumps(message)) == message
+
+    def lazy(envelope: Dict) -> LazyMessage:
+        return LazyMessage(envelope, None)  # type: ignore[arg-type]
+
+    def matched(envelope: Dict) -> LazyMessage:
+        message = lazy(envelope)
+        message.source
+        return message
+
+    def loaded(envelope: Dict) -> LazyMessage:
+        message = lazy(envelope)
+        message.load()
+        return message
+
+    before = retained(lambda envelope: unslotted(slotted(envelope)))
+    after = retained(slotted)
+    print(f"{'message':<34} {'bytes per message':>18}")
+    print(f"{'eager, unslotted':<34} {before:>18.0f}")
+    print(f"{'eager, slotted':<34} {after:>18.0f}")
+    print(f"{'lazy, untouched':<34} {retained(lazy):>18.0f}")
+    print(f"{'lazy, source read':<34} {retained(matched):>18.0f}")
+    print(f"{'lazy, loaded (kept in a context)':<34} {retained(loaded):>18.0f}")
+    print(f"slots save {before - after:.0f} bytes per eager message "
+          f"({1 - after / before:.0%})")
+
+
+if __name__ == '__main__':
+    main()
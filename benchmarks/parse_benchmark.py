@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark of parsing signald data into models.
+
+Compares the model codecs with the reflective parsing they replaced, which
+converted every attribute name and logged every ignored attribute.
+"""
+import logging
+import re
+from timeit import timeit
+from typing import Any, Callable, Dict, List, Tuple
+
+import attr
+
+from semaphore import Attachment, DataMessage, GroupV2, Profile
+from semaphore.address import Address
+
+ITERATIONS = 20000
+
+ATTACHMENT = {
+    "contentType": "image/jpeg", "id": "8jD7Qm2Lq0", "size": 48213,
+    "storedFilename": "/var/lib/signald/attachments/8jD7Qm2Lq0", "width": 1024,
+    "height": 768, "voiceNote": False, "blurhash": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+    "digest": "0dbb1a1e0c4f", "key": "b64key==",
+}
+GROUP = {
+    "id": "EdSqI90cS0UomDpgUXOlCoObWvQOXlH5G3Z2d3f4ayE=", "revision": 42,
+    "title": "Bot testers", "timer": 0, "description": "", "removed": False,
+    "members": [{"uuid": f"uuid-{i}"} for i in range(8)],
+    "pendingMembers": [], "requestingMembers": [], "memberDetail": [],
+}
+PROFILE = {
+    "name": "Alice", "profile_name": "Alice", "about": "hi", "emoji": "🦊",
+    "address": {"uuid": "uuid-1", "number": "+31600000000"},
+    "capabilities": {"gv2": True, "storage": True}, "visible_badge_ids": [],
+}
+DATA_MESSAGE = {
+    "timestamp": 1672531200000, "body": "hello", "groupV2": GROUP,
+    "attachments": [ATTACHMENT],
+}
+
+log = logging.getLogger("reflective")
+log.addHandler(logging.NullHandler())
+log.propagate = False
+
+
+def snake_to_camel(attr_name: str) -> str:
+    attr_name = re.sub(r"(_|-)+", " ", attr_name).title().replace(" ", "")
+    return ''.join([attr_name[0].lower(), attr_name[1:]])
+
+
+def reflective(cls: Any, camel_case: bool = True) -> Callable[[Dict], Any]:
+    """Create the reflective parser of a model."""
+    def parse(data: Dict) -> Any:
+        model = cls("")
+        processed = set()
+        for attr_name in attr.asdict(model):
+            data_name = snake_to_camel(attr_name) if camel_case else attr_name
+            value = data.get(data_name)
+            if attr_name == "address" and value:
+                value = Address.create_from_receive_dict(value)
+            setattr(model, attr_name, value)
+            processed.add(data_name)
+
+        for data_name in data:
+            if data_name not in processed:
+                log.warning(f"Attribute {data_name} in data was ignored")
+        return model
+    return parse
+
+
+def reflective_data_message(data: Dict) -> Tuple[Any, List[Any]]:
+    """Parse the models of a data message reflectively."""
+    return (reflective(GroupV2)(data["groupV2"]),
+            [reflective(Attachment)(a) for a in data["attachments"]])
+
+
+def codec_data_message(data: Dict) -> Tuple[Any, List[Any]]:
+    """Parse the models of a data message using the codecs."""
+    message = DataMessage.create_from_receive_dict(data)
+    return message.groupV2, message.attachments
+
+
+def main() -> None:
+    unknown = dict(GROUP, announcementsOnly=False, bannedMembers=[])
+    cases = [
+        ("attachment", reflective(Attachment), Attachment.create_from_receive_dict,
+         ATTACHMENT),
+        ("group", reflective(GroupV2), GroupV2.create_from_receive_dict, GROUP),
+        ("group (unknown keys)", reflective(GroupV2), GroupV2.create_from_receive_dict,
+         unknown),
+        ("profile", reflective(Profile, camel_case=False),
+         Profile.create_from_receive_dict, PROFILE),
+        ("data message", reflective_data_message, codec_data_message, DATA_MESSAGE),
+    ]
+
+    print(f"{'model':<22} {'reflective (us)':>16} {'codec (us)':>11} {'speedup':>8}")
+    for name, old, new, data in cases:
+        assert old(data) == new(data)
+
+        old_time = timeit(lambda: old(data), number=ITERATIONS)
+        new_time = timeit(lambda: new(data), number=ITERATIONS)
+        per_parse = 1e6 / ITERATIONS
+        print(f"{name:<22} {old_time * per_parse:>16.2f} {new_time * per_parse:>11.2f} "
+              f"{old_time / new_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark of message dispatch cost against the number of handlers.
+
+Compares the router with searching every handler regex for every message.
+"""
+import re
+from timeit import timeit
+from typing import Callable, List, Pattern, Tuple
+
+from semaphore import Router
+
+MESSAGES = [
+    "Hello bot, how are you doing today?",
+    "!cmd42 some argument",
+    "!word7 set 1200",
+    "just some chatter in a busy group without any command",
+]
+ITERATIONS = 2000
+
+
+async def handler() -> None:
+    pass
+
+
+def create_handlers(count: int) -> List[Tuple[Pattern, Callable]]:
+    """Create a mix of anchored, unanchored and generic command handlers."""
+    handlers = []
+    for i in range(count):
+        if i % 3 == 0:
+            pattern = f"^!cmd{i}( |$)"
+        elif i % 3 == 1:
+            pattern = f"!word{i} (.*)"
+        else:
+            pattern = rf"^(?:!|/)alias{i}\b"
+        handlers.append((re.compile(pattern, re.UNICODE), handler))
+    return handlers
+
+
+def linear(handlers: List[Tuple[Pattern, Callable]], body: str) -> int:
+    """Search every handler regex for the body."""
+    return sum(1 for regex, _ in handlers if re.search(regex, body))
+
+
+def routed(router: Router, body: str) -> int:
+    """Match the body using the router."""
+    return sum(1 for _ in router.match(body))
+
+
+def main() -> None:
+    print(f"{'handlers':>8} {'linear (us)':>12} {'router (us)':>12} {'speedup':>8}")
+    for count in (10, 100, 500, 1000, 5000):
+        handlers = create_handlers(count)
+        router = Router()
+        for regex, func in handlers:
+            router.add(regex, func)
+
+        for body in MESSAGES:
+            assert linear(handlers, body) == routed(router, body)
+
+        linear_time = timeit(lambda: [linear(handlers, body) for body in MESSAGES],
+                             number=ITERATIONS // 10)
+        router_time = timeit(lambda: [routed(router, body) for body in MESSAGES],
+                             number=ITERATIONS // 10)
+
+        per_message = 1e6 / (ITERATIONS // 10 * len(MESSAGES))
+        print(f"{count:>8} {linear_time * per_message:>12.2f} "
+              f"{router_time * per_message:>12.2f} "
+              f"{linear_time / router_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark of the job queue backends with a large number of timers.
+
+Puts timers spread over a month in the heap and the timing wheel, cancels half
+of them and drains the rest once the month has passed.
+"""
+import random
+import tracemalloc
+from time import perf_counter
+from typing import List, Union
+
+import anyio
+from anyio import WouldBlock
+
+from semaphore import TimingWheel
+from semaphore.queue import PriorityQueue
+
+TIMERS = 1_000_000
+START = 1.7e9
+SPAN = 60 * 60 * 24 * 30  # Month
+
+
+class Clock:
+    """Clock of the timing wheel that can be moved forward."""
+
+    def __init__(self) -> None:
+        self.now = START
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Timer:
+    """Stand-in for a job, heap entries are removed lazily by a flag."""
+
+    __slots__ = ('removed',)
+
+    def __init__(self) -> None:
+        self.removed = False
+
+
+async def fill(queue: Union[PriorityQueue, TimingWheel],
+               timestamps: List[float]) -> List[Timer]:
+    """Put a timer for every timestamp in the queue."""
+    timers = [Timer() for _ in timestamps]
+    for timestamp, timer in zip(timestamps, timers):
+        await queue.put_nowait(timestamp, timer)  # type: ignore
+    return timers
+
+
+def cancel(queue: Union[PriorityQueue, TimingWheel], timers: List[Timer]) -> None:
+    """Cancel every other timer."""
+    for timer in timers[::2]:
+        timer.removed = True
+        queue.remove(timer)  # type: ignore
+
+
+def drain(queue: Union[PriorityQueue, TimingWheel]) -> int:
+    """Get all timers from the queue and count the timers that are not canceled."""
+    fired = 0
+    while True:
+        try:
+            _, timer = queue.get_nowait()
+        except WouldBlock:
+            return fired
+        if not timer.removed:
+            fired += 1
+
+
+async def run(timing_wheel: bool, timestamps: List[float]) -> None:
+    clock = Clock()
+
+    def create() -> Union[PriorityQueue, TimingWheel]:
+        return TimingWheel(clock=clock) if timing_wheel else PriorityQueue()
+
+    queue = create()
+    start = perf_counter()
+    timers = await fill(queue, timestamps)
+    insert_time = perf_counter() - start
+
+    start = perf_counter()
+    cancel(queue, timers)
+    cancel_time = perf_counter() - start
+
+    clock.now = START + SPAN
+    start = perf_counter()
+    assert drain(queue) == TIMERS // 2
+    drain_time = perf_counter() - start
+
+    # Measure memory of the pending timers after canceling in a separate run.
+    clock.now = START
+    queue = create()
+    tracemalloc.start()
+    timers = await fill(queue, timestamps)
+    cancel(queue, timers)
+    del timers
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{type(queue).__name__:>14} {insert_time:>10.2f} {cancel_time:>10.2f} "
+          f"{drain_time:>10.2f} {memory / 2 ** 20:>14.1f}")
+
+
+def main() -> None:
+    random.seed(42)
+    timestamps = [START + random.uniform(0, SPAN) for _ in range(TIMERS)]
+
+    print(f"{TIMERS} timers, half of them canceled")
+    print(f"{'backend':>14} {'insert (s)':>10} {'cancel (s)':>10} {'drain (s)':>10} "
+          f"{'memory (MiB)':>14}")
+    anyio.run(run, False, timestamps)
+    anyio.run(run, True, timestamps)
+
+
+if __name__ == '__main__':
+    main()
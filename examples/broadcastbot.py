@@ -53,13 +53,14 @@ async def broadcast(ctx: ChatContext) -> None:
     await ctx.message.mark_read()
     message = ctx.message.get_body()[len("!broadcast"):].strip()
 
-    # Broadcast message to all subscribers.
-    for subscriber in subscribers:
-        if await ctx.bot.send_message(subscriber, message):
-            print(f"Message successfully sent to {subscriber}")
-        else:
-            print(f"Could not send message to {subscriber}")
-            del subscribers[subscriber]
+    # Broadcast message to all subscribers, at most 10 messages per second.
+    async with ctx.bot.broadcast(list(subscribers), message, rate=10) as results:
+        async for result in results:
+            if result.success:
+                print(f"Message successfully sent to {result.recipient}")
+            else:
+                print(f"Could not send message to {result.recipient}")
+                del subscribers[result.recipient]
 
 
 async def main() -> None:
@@ -31,21 +31,20 @@ import asks  # type: ignore
 from semaphore import Bot, ChatContext, StopPropagation
 
 
-async def check_price(ctx: ChatContext) -> None:
+async def fetch_price() -> int:
     content = (await asks.get("https://blockchain.info/ticker")).json()
+    return int(content['USD']['last'])
 
-    price = int(ctx.match.group(1))
-    last_price = int(content['USD']['last'])
 
-    if int(content['USD']['last']) < price:
-        if 'job' in ctx.data:
-            old_job = ctx.data["job"]
-            old_job.schedule_removal()
+async def check_price(ctx: ChatContext, last_price: int) -> None:
+    price = ctx.data["price"]
 
+    if last_price < price:
         notification = f"BTC price dropped below ${price}!\nCurrent price: ${last_price}"
         await ctx.message.reply(notification)
 
-    raise StopPropagation
+        # Unsubscribe from the price checks.
+        raise StopPropagation
 
 
 async def set_notification(ctx: ChatContext) -> None:
@@ -58,19 +57,23 @@ async def set_notification(ctx: ChatContext) -> None:
         await ctx.message.reply("Usage: !btc <dollars>")
         return
 
-    job = await ctx.job_queue.run_repeating(now, check_price, ctx, 5 * 60)
-    ctx.data["job"] = job
+    # All subscribers share a single price check.
+    ctx.data["price"] = price
+    job = await ctx.job_queue.run_shared("btc", now, fetch_price, 5 * 60)
+    job.subscribe(ctx, check_price)
 
     await ctx.message.reply("BTC price check set!")
 
 
 async def unset_notification(ctx: ChatContext) -> None:
-    if 'job' in ctx.data:
-        old_job = ctx.data["job"]
-        old_job.schedule_removal()
+    job = ctx.job_queue.get_shared("btc")
+    if job:
+        job.unsubscribe(ctx)
 
     await ctx.message.reply("BTC price check unset!")
 
+    raise StopPropagation
+
 
 async def main() -> None:
     """Start the bot."""
@@ -20,21 +20,35 @@
 from .address import Address
 from .attachment import Attachment
 from .bot import Bot
+from .broadcast import Broadcast, BroadcastResult
 from .chat_context import ChatContext
+from .context_store import ContextStore, MemoryContextStore, SQLiteContextStore
 from .data_message import DataMessage
 from .exceptions import StopPropagation
 from .group import Group
 from .groupV2 import GroupV2
-from .job import Job
+from .job import Job, SharedJob
 from .job_queue import JobQueue
+from .job_store import JobStore, SQLiteJobStore
+from .json_codec import JsonCodec, OrjsonCodec
 from .link_preview import LinkPreview
 from .mention import Mention
-from .message import Message
+from .message import LazyMessage, Message
 from .message_receiver import MessageReceiver
 from .message_sender import MessageSender
 from .meta import *
+from .model_codec import ModelCodec
 from .profile import Profile
+from .rate_limiter import RateLimiter, TokenBucket
 from .reply import Reply
+from .retry import RetryPolicy
+from .router import Router
+from .schedule import (
+    CronSchedule, IntervalSchedule, MonthlySchedule, RRuleSchedule, Schedule
+)
+from .send_scheduler import SendScheduler
 from .socket import Socket
+from .socket_pool import SocketPool
 from .sticker import Sticker
 from .sticker_pack import StickerPack
+from .timing_wheel import TimingWheel
@@ -16,14 +16,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """This module contains an object that represents a Signal message attachment."""
-import logging
-import re
 from typing import Optional
 
 import attr
 
+from .model_codec import ModelCodec
 
-@attr.s(auto_attribs=True)
+
+@attr.s(auto_attribs=True, slots=True)
 class Attachment:
     """This object represents a Signal message attachment.
 
@@ -44,17 +44,8 @@ class Attachment:
     voice_note: bool = attr.ib(default=None)
     width: int = attr.ib(default=None)
 
-    @staticmethod
-    def _snake_to_camel(attr_name: str) -> str:
-        attr_name = re.sub(r"(_|-)+", " ", attr_name).title().replace(" ", "")
-        return ''.join([attr_name[0].lower(), attr_name[1:]])
-
     def to_send_dict(self) -> dict:
-        attachment_data = attr.asdict(self)
-        send_data = {}
-        for attr_name, value in attachment_data.items():
-            if value is not None and attr_name != "stored_filename":
-                send_data[self._snake_to_camel(attr_name)] = value
+        send_data = _CODEC.encode(self, exclude=frozenset({"stored_filename"}))
 
         # Make sure the filename field is populated,
         # because the received attachment don't have the filename field.
@@ -67,19 +58,7 @@ class Attachment:
 
     @staticmethod
     def create_from_receive_dict(data: dict) -> 'Attachment':
-        log = logging.getLogger(__name__)
-
-        attachment = Attachment("")
-        attachment_attr_names = attr.asdict(attachment)
-
-        processed_data_attrs = set()
-        for attr_name in attachment_attr_names:
-            data_name = Attachment._snake_to_camel(attr_name)
-            setattr(attachment, attr_name, data.get(data_name))
-            processed_data_attrs.add(data_name)
+        return _CODEC.decode(data)
 
-        for attr_name in data:
-            if attr_name not in processed_data_attrs:
-                log.warning(f"Attribute {attr_name} in data was ignored")
 
-        return attachment
+_CODEC = ModelCodec(Attachment)
@@ -20,27 +20,42 @@ import logging
 import re
 import threading
 from datetime import datetime
+from time import monotonic
 from typing import (
-    Any, Awaitable, Callable, Dict, List, Match, Optional, Pattern, TYPE_CHECKING, Union
+    Any, Awaitable, Callable, Dict, Iterable, List, Match, Optional, Pattern, Set,
+    TYPE_CHECKING, Union
 )
 
 import anyio
+import anyio.abc
 
 from .attachment import Attachment
+from .broadcast import Broadcast
 from .chat_context import ChatContext
-from .exceptions import StopPropagation
+from .context_store import ContextStore, MemoryContextStore
+from .exceptions import ListenerStoppedError, SignaldError, StopPropagation
 from .groupV2 import GroupV2
 from .job_queue import JobQueue
+from .job_store import JobStore
+from .json_codec import JsonCodec
 from .link_preview import LinkPreview
 from .message import Message
 from .message_receiver import MessageReceiver
 from .message_sender import MessageSender
+from .rate_limiter import RateLimiter
+from .retry import RetryPolicy
+from .router import Router
+from .send_scheduler import SendScheduler
 from .socket import Socket
+from .socket_pool import SocketPool
 
 
 class Bot:
     """This object represents a simple (rule-based) Signal Private Messenger bot."""
 
+    # Initial delay in seconds before reconnecting to signald.
+    RECONNECT_DELAY: float = 1.0
+
     def __init__(self,
                  username: str,
                  profile_name: Optional[str] = None,
@@ -50,7 +65,24 @@ class Bot:
                  group_auto_accept: bool = True,
                  logging_level: int = logging.INFO,
                  socket_path: Optional[str] = None,
-                 raise_errors: bool = False) -> None:
+                 raise_errors: bool = False,
+                 max_line_size: int = Socket.MAX_LINE_SIZE,
+                 send_pool_min_size: int = 1,
+                 send_pool_max_size: int = 4,
+                 reconnect: bool = True,
+                 reconnect_max_delay: float = 60.0,
+                 json_codec: Optional[JsonCodec] = None,
+                 context_store: Optional[ContextStore] = None,
+                 job_max_concurrency: int = 16,
+                 job_timeout: Optional[float] = None,
+                 job_timing_wheel: bool = False,
+                 job_store: Optional[JobStore] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 send_max_in_flight: int = 8,
+                 profile_cache_ttl: float = 300.0,
+                 profile_cache_size: int = 1024,
+                 send_pool_idle_timeout: float = 30.0) -> None:
         """Initialize bot."""
         self._username: str = username
         self._profile_name: Optional[str] = profile_name
@@ -59,13 +91,34 @@ class Bot:
         self._profile_about: Optional[str] = profile_about
         self._group_auto_accept: bool = group_auto_accept
         self._socket_path: Optional[str] = socket_path
-        self._receiver: MessageReceiver
+        self._max_line_size: int = max_line_size
+        self._send_pool_min_size: int = send_pool_min_size
+        self._send_pool_max_size: int = send_pool_max_size
+        self._send_pool_idle_timeout: float = send_pool_idle_timeout
+        self._reconnect: bool = reconnect
+        self._reconnect_max_delay: float = reconnect_max_delay
+        self._json_codec: JsonCodec = json_codec or JsonCodec()
+        self._reconnect_count: int = 0
+        self._reconnect_downtime: float = 0.0
+        self._receiver: Optional[MessageReceiver] = None
         self._sender: MessageSender
         self._receive_socket: Optional[Socket] = None
-        self._send_socket: Optional[Socket] = None
         self._job_queue: JobQueue
-        self._handlers: List = []
-        self._chat_context: Dict[str, ChatContext] = {}
+        self._job_max_concurrency: int = job_max_concurrency
+        self._job_timeout: Optional[float] = job_timeout
+        self._job_timing_wheel: bool = job_timing_wheel
+        self._job_store: Optional[JobStore] = job_store
+        self._rate_limiter: Optional[RateLimiter] = rate_limiter
+        self._retry_policy: Optional[RetryPolicy] = retry_policy
+        self._send_max_in_flight: int = send_max_in_flight
+        self._profile_cache_ttl: float = profile_cache_ttl
+        self._profile_cache_size: int = profile_cache_size
+        self._router: Router = Router()
+        self._group_revisions: Dict[str, Optional[int]] = {}
+        self._group_checks: Set[str] = set()
+        self._context_store: ContextStore = (
+            context_store if context_store is not None else MemoryContextStore()
+        )
         self._exception_handler: Optional[Callable[[Exception, ChatContext],
                                                    Awaitable[None]]] = None
         self._raise_errors = raise_errors
@@ -77,12 +130,32 @@ class Bot:
         )
         self.log = logging.getLogger(__name__)
 
+    @property
+    def reconnect_count(self) -> int:
+        """Number of times the bot reconnected to signald to receive messages."""
+        return self._reconnect_count
+
+    @property
+    def reconnect_downtime(self) -> float:
+        """Total time in seconds the bot was not receiving messages due to reconnects."""
+        return self._reconnect_downtime
+
+    @property
+    def envelopes_decoded(self) -> int:
+        """Number of received signald envelopes that were decoded."""
+        return self._receiver.envelopes_decoded if self._receiver else 0
+
+    @property
+    def envelopes_skipped(self) -> int:
+        """Number of received signald envelopes that were skipped without decoding."""
+        return self._receiver.envelopes_skipped if self._receiver else 0
+
     def register_handler(self, regex: Union[str, Pattern], func: Callable) -> None:
         """Register a chat handler with a regex."""
         if not isinstance(regex, type(re.compile(""))):
             regex = re.compile(regex, re.UNICODE)
 
-        self._handlers.append((regex, func))
+        self._router.add(regex, func)
         self.log.info(f"Handler <{func.__name__}> registered ('{regex.pattern}')")
 
     def set_exception_handler(self, func: Callable) -> None:
@@ -97,37 +170,92 @@ class Bot:
 
         return decorator
 
+    async def _get_context(self,
+                           context_id: str,
+                           message: Message,
+                           match: Match) -> ChatContext:
+        """Retrieve or create a chat context."""
+        # Chat contexts and their jobs keep the message, keep it compact.
+        message.load()
+        context = await self._context_store.get(context_id)
+        if context is not None:
+            context.message = message
+            context.match = match
+            self.log.info(f"Chat context exists for {context_id}")
+            return context
+
+        context = ChatContext(message, match, self._job_queue, self)
+        data = await self._context_store.load(context_id)
+        if data is not None:
+            context.data.update(data)
+            self.log.info(f"Chat context loaded for {context_id}")
+        else:
+            self.log.info(f"Chat context created for {context_id}")
+        return context
+
+    async def _restore_context(self, message: Message, match: Match) -> ChatContext:
+        """Retrieve or create the chat context of a restored job."""
+        context_id = ChatContext.get_context_id(message)
+        context = await self._get_context(context_id, message, match)
+        await self._context_store.put(context_id, context)
+        return context
+
+    def _is_account(self, address: Any) -> bool:
+        """Check if an address of a group member is the bot account."""
+        if isinstance(address, dict):
+            return self._username in (address.get("number"), address.get("uuid"))
+        return self._username in (address.number, address.uuid)
+
+    async def _accept_pending_invitation(self,
+                                         group_id: str,
+                                         revision: Optional[int]) -> None:
+        """Accept the invitation to a group if the bot account is pending."""
+        # Membership is checked once for every revision of the group.
+        if group_id in self._group_checks:
+            return
+        if group_id in self._group_revisions and \
+                self._group_revisions[group_id] == revision:
+            return
+
+        # The revision is only recorded after a successful check, a failed
+        # check is retried on the next message of the group.
+        self._group_checks.add(group_id)
+        try:
+            group = await self.get_group(group_id)
+            if not group:
+                self.log.warning(f"Could not check membership of group {group_id}")
+                return
+
+            # Accept when the bot is pending, or when the bot account is not
+            # found among the members, for example when pending by uuid only.
+            if any(map(self._is_account, group.pending_members or [])) or \
+                    not any(map(self._is_account, group.members or [])):
+                self.log.info(f"Accepting invitation to group {group_id}")
+                await self.accept_invitation(group_id)
+            self._group_revisions[group_id] = revision
+        except (SignaldError, ConnectionError) as exc:
+            self.log.warning(f"Could not accept invitation to group {group_id}",
+                             exc_info=exc)
+        finally:
+            self._group_checks.discard(group_id)
+
     async def _handle_message(self,
                               message: Message,
                               func: Callable, match: Match) -> None:
         """Handle a matched message."""
         message_id = id(message)
 
-        # Get context id.
-        group_id: Optional[str] = message.get_group_id()
-        if group_id is not None:
-            context_id = f"{group_id}+{message.source.uuid}"
-        else:
-            context_id = message.source.uuid
+        context_id = ChatContext.get_context_id(message)
+        context = await self._get_context(context_id, message, match)
 
-        # Retrieve or create chat context.
-        if self._chat_context.get(context_id, False):
-            context = self._chat_context[context_id]
-            context.message = message
-            context.match = match
-            self.log.info(f"Chat context exists for {context_id}")
-        else:
-            context = ChatContext(message, match, self._job_queue, self)
-            self.log.info(f"Chat context created for {context_id}")
-
-            # Accept group invitation.
-            if group_id is not None and self._group_auto_accept:
-                await self.accept_invitation(group_id)
+        # Accept group invitation.
+        group_id: Optional[str] = message.get_group_id()
+        if group_id is not None and self._group_auto_accept:
+            await self._accept_pending_invitation(group_id, message.get_group_revision())
 
         # Process received message and send reply.
         try:
             await func(context)
-            self._chat_context[context_id] = context
             self.log.debug(f"Message ({message_id}) processed by handler {func.__name__}")
         except StopPropagation:
             raise
@@ -138,22 +266,20 @@ class Bot:
             )
             if self._exception_handler:
                 await self._exception_handler(exc, context)
+        finally:
+            # Handlers may change the context data before they stop or fail.
+            await self._context_store.put(context_id, context)
 
     async def _match_message(self, message: Message) -> None:
         """Match an incoming message against a handler."""
         message_id = id(message)
 
         self.log.debug(f"Message ({message_id}) received from {message.source.uuid}")
-        self.log.debug(str(message))
-
-        # Loop over all registered handlers.
-        for regex, func in self._handlers:
-            # Match message text against handlers.
-            match = re.search(regex, message.get_body())
-            if not match:
-                self.log.debug(f'skipping {func.__name__}')
-                continue
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(str(message))
 
+        # Loop over all handlers matching the message text.
+        for regex, func, match in self._router.match(message.get_body()):
             self.log.debug(
                 f"Message matched against handler <{func.__name__}> ('{regex.pattern}')"
             )
@@ -165,27 +291,42 @@ class Bot:
 
     async def __aenter__(self) -> 'Bot':
         """Connect to the bot's internal socket."""
-        self._send_socket = await Socket(self._username,
-                                         self._socket_path,
-                                         False).__aenter__()
-        self._sender = MessageSender(self._username, self._send_socket,
-                                     self._raise_errors)
+        send_pool = SocketPool(self._username,
+                               self._socket_path,
+                               self._send_pool_min_size,
+                               self._send_pool_max_size,
+                               self._max_line_size,
+                               self._json_codec,
+                               self._send_pool_idle_timeout)
+        self._sender = await MessageSender(self._username, send_pool,
+                                           self._raise_errors,
+                                           self._json_codec,
+                                           self._rate_limiter,
+                                           self._retry_policy,
+                                           SendScheduler(self._send_max_in_flight),
+                                           self._profile_cache_ttl,
+                                           self._profile_cache_size).__aenter__()
         return self
 
     async def __aexit__(self, *excinfo: Any) -> None:
         """Disconnect from the bot's internal socket."""
         if self._receive_socket:
             await self._receive_socket.__aexit__(*excinfo)
-        if self._send_socket:
-            await self._send_socket.__aexit__(*excinfo)
+        await self._sender.__aexit__(*excinfo)
+        await self._context_store.close()
+        if self._job_store is not None:
+            await self._job_store.close()
 
     async def start(self) -> None:
         """Start the bot event loop."""
         self.log.info("Bot started")
         self._receive_socket = await Socket(self._username,
                                             self._socket_path,
-                                            True).__aenter__()
-        self._receiver = MessageReceiver(self._receive_socket, self._sender)
+                                            True,
+                                            self._max_line_size,
+                                            self._json_codec).__aenter__()
+        self._receiver = MessageReceiver(self._receive_socket, self._sender,
+                                         self._json_codec, data_messages_only=True)
 
         if self._profile_name:
             await self.set_profile(self._profile_name,
@@ -194,17 +335,60 @@ class Bot:
                                    self._profile_about)
 
         async with anyio.create_task_group() as tg:
-            self._job_queue = JobQueue(self._sender)
+            self._job_queue = JobQueue(self._sender,
+                                       self._job_max_concurrency,
+                                       self._job_timeout,
+                                       self._job_timing_wheel,
+                                       self._job_store,
+                                       self._context_store)
+            await self._job_queue.restore(self._restore_context)
             await tg.spawn(self._job_queue.start)
-
-            # handle incoming messages in parallel
-            async for message in self._receiver.receive():
-                if message.data_message is not None:
+            await tg.spawn(self._context_store.start)
+            if self._job_store is not None:
+                await tg.spawn(self._job_store.start)
+
+            await self._receive(tg, self._receiver, self._receive_socket)
+
+    async def _receive(self,
+                       tg: anyio.abc.TaskGroup,
+                       receiver: MessageReceiver,
+                       socket: Socket) -> None:
+        """Receive messages, reconnecting when signald stops delivering them."""
+        delay = self.RECONNECT_DELAY
+        while True:
+            try:
+                # handle incoming messages in parallel
+                async for message in receiver.receive():
+                    delay = self.RECONNECT_DELAY
                     await tg.spawn(self._match_message, message)
+            except (ConnectionError, ListenerStoppedError) as exc:
+                if not self._reconnect:
+                    raise
+                self.log.warning(f"Stopped receiving messages ({exc}), reconnecting")
+
+            # Reconnect with exponential backoff, handlers and jobs keep running.
+            disconnected = monotonic()
+            while True:
+                self.log.info(f"Reconnecting in {delay:.1f} seconds")
+                await anyio.sleep(delay)
+                delay = min(delay * 2, self._reconnect_max_delay)
+                try:
+                    await socket.reconnect()
+                    break
+                except OSError as exc:
+                    self.log.warning(f"Reconnecting failed ({exc})")
+
+            downtime = monotonic() - disconnected
+            self._reconnect_count += 1
+            self._reconnect_downtime += downtime
+            self.log.info(f"Reconnected after {downtime:.1f} seconds "
+                          f"({self._reconnect_count} reconnects, "
+                          f"{self._reconnect_downtime:.1f} seconds downtime in total)")
 
     async def send_message(self, receiver: str, body: str,
                            attachments: Optional[List[Attachment]] = None,
-                           link_previews: Optional[List[LinkPreview]] = None) -> bool:
+                           link_previews: Optional[List[LinkPreview]] = None,
+                           priority: int = SendScheduler.INTERACTIVE) -> bool:
         """
         Send a message.
 
@@ -212,11 +396,42 @@ class Bot:
         :param body:          The body of the message.
         :param attachments:   Optional attachments to the message.
         :param link_previews: Optional link previews for the message.
+        :param priority:      Priority class of the message.
 
         :return: Returns whether sending is successful
         :rtype: bool
         """
-        return await self._sender.send_message(receiver, body, attachments, link_previews)
+        return await self._sender.send_message(receiver, body, attachments,
+                                               link_previews, priority)
+
+    def broadcast(self,
+                  recipients: Iterable[str],
+                  body: str,
+                  attachments: Optional[List[Attachment]] = None,
+                  link_previews: Optional[List[LinkPreview]] = None,
+                  concurrency: int = 8,
+                  rate: Optional[float] = None,
+                  completed: Optional[Iterable[str]] = None) -> Broadcast:
+        """
+        Broadcast a message to many recipients.
+
+        Use the broadcast as async context manager and iterate over it to get
+        the result of every recipient as it is sent.
+
+        :param recipients:    The recipients of the message (uuids, numbers or groups).
+        :param body:          The body of the message.
+        :param attachments:   Optional attachments to the message.
+        :param link_previews: Optional link previews for the message.
+        :param concurrency:   Maximum number of messages sent at the same time.
+        :param rate:          Optional maximum number of messages sent per second.
+        :param completed:     Recipients to skip, like the completed recipients
+                              of a broadcast to resume.
+
+        :return: Returns the broadcast
+        :rtype: Broadcast
+        """
+        return Broadcast(self._sender, recipients, body, attachments, link_previews,
+                         concurrency, rate, completed)
 
     async def set_profile(self,
                           profile_name: str,
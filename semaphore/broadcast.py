@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that represent a broadcast of a message."""
+from __future__ import annotations
+
+import logging
+from time import monotonic
+from typing import Any, Iterable, Iterator, List, Optional, Set, TYPE_CHECKING
+
+import anyio
+import anyio.abc
+import attr
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+from .send_scheduler import SendScheduler
+
+if TYPE_CHECKING:
+    from .attachment import Attachment
+    from .link_preview import LinkPreview
+    from .message_sender import MessageSender
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class BroadcastResult:
+    """This object represents the result of a broadcast to a recipient."""
+
+    recipient: str
+    success: bool
+    error: Optional[Exception] = attr.ib(default=None)
+
+
+class Broadcast:
+    """This object represents a broadcast of a message to many recipients.
+
+    Messages are sent with at most concurrency sends in flight and at most
+    rate messages per second. Entering the broadcast starts sending, iterate
+    over it to get the result of every recipient as soon as it is known.
+    Leaving the broadcast early stops sending. Recipients in completed are
+    skipped, pass the completed set of a broadcast to resume it. Messages are
+    sent with bulk priority, so replies to users go first.
+    """
+
+    def __init__(self,
+                 sender: MessageSender,
+                 recipients: Iterable[str],
+                 body: str,
+                 attachments: Optional[List[Attachment]] = None,
+                 link_previews: Optional[List[LinkPreview]] = None,
+                 concurrency: int = 8,
+                 rate: Optional[float] = None,
+                 completed: Optional[Iterable[str]] = None) -> None:
+        """Initialize broadcast."""
+        if concurrency < 1:
+            raise ValueError("Concurrency should be at least 1")
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate should be positive")
+
+        self._sender: MessageSender = sender
+        self._recipients: List[str] = list(dict.fromkeys(recipients))
+        self._body: str = body
+        self._attachments: Optional[List[Attachment]] = attachments
+        self._link_previews: Optional[List[LinkPreview]] = link_previews
+        self._concurrency: int = concurrency
+        self._interval: float = 1 / rate if rate is not None else 0.0
+        self._next_send: float = 0.0
+        self._pace_lock = anyio.Lock()
+        self._task_group: Optional[anyio.abc.TaskGroup] = None
+        self._results: Optional[MemoryObjectReceiveStream] = None
+
+        # Recipients the message was sent to successfully.
+        self.completed: Set[str] = set(completed or ())
+
+        self.log = logging.getLogger(__name__)
+
+    def remaining(self) -> List[str]:
+        """Get the recipients the message is not sent to successfully."""
+        return [recipient for recipient in self._recipients
+                if recipient not in self.completed]
+
+    async def _pace(self) -> None:
+        """Wait until the next message may be sent according to the rate."""
+        if not self._interval:
+            return
+
+        async with self._pace_lock:
+            now = monotonic()
+            if self._next_send > now:
+                await anyio.sleep(self._next_send - now)
+            self._next_send = max(now, self._next_send) + self._interval
+
+    async def _send(self,
+                    recipients: Iterator[str],
+                    results: MemoryObjectSendStream) -> None:
+        """Send the message to recipients until all recipients are taken."""
+        async with results:
+            for recipient in recipients:
+                await self._pace()
+                error: Optional[Exception] = None
+                try:
+                    success = await self._sender.send_message(
+                        recipient, self._body, self._attachments, self._link_previews,
+                        SendScheduler.BULK
+                    )
+                except Exception as exc:
+                    success = False
+                    error = exc
+
+                if success:
+                    self.completed.add(recipient)
+                else:
+                    self.log.warning(f"Broadcast to {recipient} failed")
+                await results.send(BroadcastResult(recipient, success, error))
+
+    async def __aenter__(self) -> Broadcast:
+        """Start sending the message."""
+        remaining = self.remaining()
+        send_stream, self._results = anyio.create_memory_object_stream(self._concurrency)
+        self._task_group = anyio.create_task_group()
+        await self._task_group.__aenter__()
+
+        # The workers share the iterator, every recipient is taken once.
+        recipients = iter(remaining)
+        async with send_stream:
+            for _ in range(min(self._concurrency, len(remaining))):
+                await self._task_group.spawn(self._send, recipients, send_stream.clone())
+
+        self.log.info(f"Broadcast to {len(remaining)} recipients started")
+        return self
+
+    async def __aexit__(self, *excinfo: Any) -> Optional[bool]:
+        """Stop sending the message."""
+        if self._task_group is None or self._results is None:
+            return None
+
+        self._task_group.cancel_scope.cancel()
+        try:
+            return await self._task_group.__aexit__(*excinfo)
+        finally:
+            await self._results.aclose()
+            self.log.info(f"Broadcast stopped, sent to {len(self.completed)} of "
+                          f"{len(self._recipients)} recipients")
+
+    def __aiter__(self) -> Broadcast:
+        """Iterate over the results of the recipients."""
+        return self
+
+    async def __anext__(self) -> BroadcastResult:
+        """Get the next result."""
+        if self._results is None:
+            raise RuntimeError("Broadcast is not started")
+        try:
+            return await self._results.receive()
+        except anyio.EndOfStream:
+            raise StopAsyncIteration
@@ -18,7 +18,7 @@
 """This module contains an object that represents the context of a chat."""
 from __future__ import annotations
 
-from typing import Any, Dict, Match, TYPE_CHECKING
+from typing import Any, Dict, Match, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .bot import Bot
@@ -39,3 +39,15 @@ class ChatContext(object):
         self.job_queue: JobQueue = job_queue
         self.bot: Bot = bot
         self.data: Dict[str, Any] = {}
+
+    @staticmethod
+    def get_context_id(message: Message) -> str:
+        """Get the id of the chat context of a message."""
+        group_id: Optional[str] = message.get_group_id()
+        if group_id is not None:
+            return f"{group_id}+{message.source.uuid}"
+        return message.source.uuid
+
+    def get_id(self) -> str:
+        """Get the id of the chat context."""
+        return ChatContext.get_context_id(self.message)
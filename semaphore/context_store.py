@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that store chat contexts."""
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import sys
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import monotonic, time
+from typing import (
+    Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+)
+
+import anyio
+import anyio.to_thread
+
+if TYPE_CHECKING:
+    from .chat_context import ChatContext
+
+
+def _deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    """Estimate the size in bytes of an object and the containers it holds."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def estimate_context_size(context: ChatContext) -> int:
+    """Estimate the size in bytes of the data of a chat context."""
+    return sys.getsizeof(context) + _deep_sizeof(context.data, set())
+
+
+class ContextStore(ABC):
+    """This object represents a store for chat contexts.
+
+    Subclass this object to keep chat contexts elsewhere, the bot uses
+    the store to look up the context of every handled message.
+    """
+
+    @abstractmethod
+    async def get(self, context_id: str) -> Optional[ChatContext]:
+        """Get a chat context, returns None if the context is not in the store."""
+
+    @abstractmethod
+    async def put(self, context_id: str, context: ChatContext) -> None:
+        """Put a chat context in the store."""
+
+    @abstractmethod
+    async def remove(self, context_id: str) -> None:
+        """Remove a chat context from the store."""
+
+    async def load(self, context_id: str) -> Optional[Dict[str, Any]]:
+        """Load the persisted data of a chat context that is not in the store."""
+        return None
+
+    async def start(self) -> None:
+        """Run background work of the store, like flushing contexts."""
+
+    async def close(self) -> None:
+        """Close the store, flushing pending changes."""
+
+
+class MemoryContextStore(ContextStore):
+    """This object represents an in-memory store for chat contexts.
+
+    The store evicts the least recently used contexts when it holds more
+    than max_entries contexts or when the estimated size of their data
+    exceeds max_memory bytes. Contexts not used for ttl seconds are evicted
+    as well. All limits are optional, without limits contexts are kept
+    forever. The on_evict callback is awaited for every evicted context.
+    """
+
+    def __init__(self,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 max_memory: Optional[int] = None,
+                 on_evict: Optional[Callable[[str, ChatContext],
+                                             Awaitable[None]]] = None,
+                 sizeof: Callable[[ChatContext], int] = estimate_context_size) -> None:
+        """Initialize memory context store."""
+        self._max_entries: Optional[int] = max_entries
+        self._ttl: Optional[float] = ttl
+        self._max_memory: Optional[int] = max_memory
+        self._on_evict = on_evict
+        self._sizeof = sizeof
+        self._contexts: OrderedDict[str, Tuple[ChatContext, float, int]] = OrderedDict()
+        self._memory: int = 0
+
+        self.log = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        """Get the number of contexts in the store."""
+        return len(self._contexts)
+
+    def memory(self) -> int:
+        """Get the estimated size in bytes of the contexts in the store."""
+        return self._memory
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        """Check if a context last accessed at a given time is expired."""
+        return self._ttl is not None and now - last_access > self._ttl
+
+    async def get(self, context_id: str) -> Optional[ChatContext]:
+        """Get a chat context, returns None if the context is not in the store."""
+        entry = self._contexts.get(context_id)
+        if entry is None:
+            return None
+
+        context, last_access, size = entry
+        now = monotonic()
+        if self._expired(last_access, now):
+            await self._evict(context_id)
+            return None
+
+        self._contexts[context_id] = (context, now, size)
+        self._contexts.move_to_end(context_id)
+        return context
+
+    async def put(self, context_id: str, context: ChatContext) -> None:
+        """Put a chat context in the store."""
+        entry = self._contexts.pop(context_id, None)
+        if entry is not None:
+            self._memory -= entry[2]
+
+        size = self._sizeof(context) if self._max_memory is not None else 0
+        self._contexts[context_id] = (context, monotonic(), size)
+        self._memory += size
+
+        await self._enforce_limits()
+
+    async def remove(self, context_id: str) -> None:
+        """Remove a chat context from the store."""
+        entry = self._contexts.pop(context_id, None)
+        if entry is not None:
+            self._memory -= entry[2]
+
+    def _over_limits(self) -> bool:
+        """Check if the store holds more contexts or memory than allowed."""
+        if self._max_entries is not None and len(self._contexts) > self._max_entries:
+            return True
+        return self._max_memory is not None and self._memory > self._max_memory
+
+    async def _enforce_limits(self) -> None:
+        """Evict expired contexts and least recently used contexts over the limits."""
+        now = monotonic()
+        while self._contexts:
+            context_id, (_, last_access, _) = next(iter(self._contexts.items()))
+            if not (self._over_limits() or self._expired(last_access, now)):
+                break
+            await self._evict(context_id)
+
+    async def _evict(self, context_id: str) -> None:
+        """Evict a chat context from the store."""
+        context, _, size = self._contexts.pop(context_id)
+        self._memory -= size
+        self.log.debug(f"Chat context evicted for {context_id}")
+
+        if self._on_evict:
+            try:
+                await self._on_evict(context_id, context)
+            except Exception as exc:
+                self.log.error(f"Eviction callback for {context_id} failed",
+                               exc_info=exc)
+
+
+class SQLiteContextStore(MemoryContextStore):
+    """This object represents a chat context store persisted in SQLite.
+
+    Contexts are kept in memory like the memory context store, with the
+    same limits. The data of changed contexts is written to the database
+    in batches every flush_interval seconds, or as soon as flush_threshold
+    contexts changed. Database access runs in a worker thread. Only JSON
+    serializable values in the context data are persisted.
+    """
+
+    def __init__(self,
+                 path: str,
+                 flush_interval: float = 5.0,
+                 flush_threshold: int = 100,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 max_memory: Optional[int] = None,
+                 on_evict: Optional[Callable[[str, ChatContext],
+                                             Awaitable[None]]] = None) -> None:
+        """Initialize SQLite context store."""
+        super().__init__(max_entries, ttl, max_memory, on_evict)
+        self._path: str = path
+        self._flush_interval: float = flush_interval
+        self._flush_threshold: int = flush_threshold
+        self._connection: Optional[sqlite3.Connection] = None
+        self._db_lock = anyio.Lock()
+        # Changed contexts by id, None for removed contexts.
+        self._dirty: Dict[str, Optional[ChatContext]] = {}
+        # Created when the store starts, events need a running event loop.
+        self._flush_needed: Optional[anyio.Event] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the database, creating the table if needed."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS chat_context ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _serialize(self, context_id: str, data: Dict[str, Any]) -> str:
+        """Serialize context data to JSON, leaving out values that are not JSON."""
+        try:
+            return json.dumps(data)
+        except (TypeError, ValueError):
+            pass
+
+        serializable = {}
+        for key, value in data.items():
+            try:
+                json.dumps({key: value})
+                serializable[key] = value
+            except (TypeError, ValueError):
+                self.log.debug(f"Chat context data '{key}' of {context_id} "
+                               f"is not persisted")
+        return json.dumps(serializable)
+
+    def _write(self, updates: List[Tuple[str, str, float]], removals: List[str]) -> None:
+        """Write context data to the database."""
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO chat_context (id, data, updated) "
+                "VALUES (?, ?, ?)",
+                updates
+            )
+            connection.executemany("DELETE FROM chat_context WHERE id = ?",
+                                   [(context_id,) for context_id in removals])
+
+    def _read(self, context_id: str) -> Optional[str]:
+        """Read context data from the database."""
+        row = self._connect().execute(
+            "SELECT data FROM chat_context WHERE id = ?", (context_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    async def put(self, context_id: str, context: ChatContext) -> None:
+        """Put a chat context in the store and mark it for flushing."""
+        self._dirty[context_id] = context
+        if len(self._dirty) >= self._flush_threshold and \
+                self._flush_needed is not None:
+            self._flush_needed.set()
+        await super().put(context_id, context)
+
+    async def remove(self, context_id: str) -> None:
+        """Remove a chat context from the store and the database."""
+        self._dirty[context_id] = None
+        await super().remove(context_id)
+
+    async def load(self, context_id: str) -> Optional[Dict[str, Any]]:
+        """Load the persisted data of a chat context that is not in the store."""
+        if context_id in self._dirty:
+            # Evicted before it was flushed, the context has the latest data.
+            context = self._dirty[context_id]
+            return context.data if context is not None else None
+
+        async with self._db_lock:
+            data = await anyio.to_thread.run_sync(self._read, context_id)
+        return json.loads(data) if data is not None else None
+
+    async def flush(self) -> None:
+        """Write all changed contexts to the database."""
+        if not self._dirty:
+            return
+
+        # Serialize on the event loop, so handlers can not change data meanwhile.
+        dirty, self._dirty = self._dirty, {}
+        now = time()
+        updates = [(context_id, self._serialize(context_id, context.data), now)
+                   for context_id, context in dirty.items() if context is not None]
+        removals = [context_id for context_id, context in dirty.items()
+                    if context is None]
+
+        try:
+            async with self._db_lock:
+                await anyio.to_thread.run_sync(self._write, updates, removals)
+        except Exception:
+            # Keep the contexts for the next flush, unless they changed since.
+            for context_id, context in dirty.items():
+                self._dirty.setdefault(context_id, context)
+            raise
+        self.log.debug(f"Flushed {len(updates)} chat contexts, removed {len(removals)}")
+
+    async def start(self) -> None:
+        """Flush changed contexts periodically."""
+        self._flush_needed = anyio.Event()
+        while True:
+            with anyio.move_on_after(self._flush_interval):
+                await self._flush_needed.wait()
+            self._flush_needed = anyio.Event()
+
+            try:
+                await self.flush()
+            except Exception as exc:
+                self.log.error("Flushing chat contexts failed", exc_info=exc)
+
+    async def close(self) -> None:
+        """Flush changed contexts and close the database."""
+        try:
+            await self.flush()
+        finally:
+            if self._connection is not None:
+                async with self._db_lock:
+                    await anyio.to_thread.run_sync(self._connection.close)
+                self._connection = None
@@ -18,20 +18,20 @@
 """This module contains an object that represents a Signal data message."""
 from __future__ import annotations
 
-from typing import List, Optional, TYPE_CHECKING
+from typing import List, Optional
 
 import attr
 
-if TYPE_CHECKING:
-    from .attachment import Attachment
-    from .group import Group
-    from .groupV2 import GroupV2
-    from .link_preview import LinkPreview
-    from .mention import Mention
-    from .sticker import Sticker
+from .attachment import Attachment
+from .group import Group
+from .groupV2 import GroupV2
+from .link_preview import LinkPreview
+from .mention import Mention
+from .sticker import Sticker
+from .sticker_pack import StickerPack
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class DataMessage:
     """This object represents a Signal data message."""
 
@@ -44,3 +44,49 @@ class DataMessage:
     mentions: List[Mention] = attr.ib(factory=list)
     sticker: Optional[Sticker] = attr.ib(default=None)
     previews: List[LinkPreview] = attr.ib(factory=list)
+
+    @staticmethod
+    def create_from_receive_dict(data: dict) -> 'DataMessage':
+        group: Optional[Group] = None
+        groupV2: Optional[GroupV2] = None
+        if data.get("group"):
+            group = Group(
+                group_id=data["group"].get("groupId"),
+                name=data["group"].get("name"),
+                group_type=data["group"].get("type"),
+            )
+        if data.get("groupV2"):
+            groupV2 = GroupV2.create_from_receive_dict(data["groupV2"])
+
+        sticker_data = data.get("sticker")
+        sticker: Optional[Sticker] = None
+        if sticker_data:
+            pack = StickerPack(
+                pack_id=sticker_data["packID"],
+                pack_key=sticker_data["packKey"],
+            )
+            sticker = Sticker(
+                sticker_id=sticker_data["stickerID"],
+                pack=pack,
+            )
+
+        return DataMessage(
+            timestamp=data["timestamp"],
+            body=data.get("body", ""),
+            expires_in_seconds=data.get("expiresInSeconds", 0),
+            attachments=[
+                Attachment.create_from_receive_dict(attachment)
+                for attachment in data.get("attachments", [])
+            ],
+            mentions=[
+                Mention.create_from_receive_dict(mention)
+                for mention in data.get("mentions", [])
+            ],
+            previews=[
+                LinkPreview.create_from_receive_dict(link_preview)
+                for link_preview in data.get("previews", [])
+            ],
+            group=group,
+            groupV2=groupV2,
+            sticker=sticker,
+        )
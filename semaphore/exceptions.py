@@ -23,6 +23,10 @@ class StopPropagation(Exception):
     """Raise this to prevent further handlers from running on this message."""
 
 
+class ListenerStoppedError(ValueError):
+    """Raised when signald stops delivering messages for the account."""
+
+
 class SignaldError(Exception):
     """This is the base class for Signald Errors"""
     IDENTIFIER: str
@@ -19,7 +19,7 @@
 import attr
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class Group:
     """This object represents Signal group info."""
 
@@ -16,16 +16,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """This module contains an object that represents Signal group v2 info."""
-import logging
-import re
-from typing import Dict, List
+from typing import List
 
 import attr
 
 from .address import Address
+from .model_codec import ModelCodec
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class GroupV2:
     """This object represents Signal group v2 info.
 
@@ -46,26 +45,9 @@ class GroupV2:
     pending_members: List[Address] = attr.ib(default=[])
     requesting_members: List[Address] = attr.ib(default=[])
 
-    @staticmethod
-    def _snake_to_camel(attr_name: str) -> str:
-        attr_name = re.sub(r"(_|-)+", " ", attr_name).title().replace(" ", "")
-        return ''.join([attr_name[0].lower(), attr_name[1:]])
-
     @staticmethod
     def create_from_receive_dict(data: dict) -> 'GroupV2':
-        log = logging.getLogger(__name__)
-
-        group = GroupV2("")
-        group_attr_names = attr.asdict(group)
-
-        processed_data_attrs = set()
-        for attr_name in group_attr_names:
-            data_name = GroupV2._snake_to_camel(attr_name)
-            setattr(group, attr_name, data.get(data_name))
-            processed_data_attrs.add(data_name)
+        return _CODEC.decode(data)
 
-        for attr_name in data:
-            if attr_name not in processed_data_attrs:
-                log.warning(f"Attribute {attr_name} in data was ignored")
 
-        return group
+_CODEC = ModelCodec(GroupV2)
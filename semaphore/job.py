@@ -15,17 +15,23 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
-"""This module contains an object that represents a bot job."""
+"""This module contains objects that represent bot jobs."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Callable, Optional, TYPE_CHECKING
+import logging
+from time import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from dateutil.relativedelta import relativedelta
+import anyio
+
+from .exceptions import StopPropagation
+from .schedule import IntervalSchedule, MonthlySchedule, Schedule
+from .send_scheduler import SendScheduler
 
 if TYPE_CHECKING:
     from .chat_context import ChatContext
     from .message import Message
+    from .message_sender import MessageSender
     from .reply import Reply
 
 
@@ -34,42 +40,90 @@ class Job(object):
 
     def __init__(self,
                  handler: Callable,
-                 context: ChatContext,
+                 context: Optional[ChatContext],
                  repeat: bool = False,
                  monthly: bool = False,
-                 interval: Optional[int] = None) -> None:
+                 interval: Optional[int] = None,
+                 overlap: bool = True,
+                 timeout: Optional[float] = None,
+                 on_removal: Optional[Callable[[Job], None]] = None,
+                 job_id: Optional[str] = None,
+                 schedule: Optional[Schedule] = None) -> None:
         """Initialize job."""
         self._handler = handler
         self._context = context
-        self._repeat: bool = repeat
-        self._interval: Optional[int] = interval
-        self._monthly: bool = monthly
         self._remove: bool = False
+        self._overlap: bool = overlap
+        self._timeout: Optional[float] = timeout
+        self._running: int = 0
+        self._on_removal: Optional[Callable[[Job], None]] = on_removal
+        self._id: Optional[str] = job_id
+
+        # Repeating jobs without a schedule repeat relative to their previous run.
+        if schedule is None and repeat:
+            if monthly:
+                schedule = MonthlySchedule()
+            elif interval:
+                schedule = IntervalSchedule(interval)
+        self._schedule: Optional[Schedule] = schedule
+
+    def get_id(self) -> Optional[str]:
+        """Get the id of the job in the job store, None if it is not stored."""
+        return self._id
+
+    def get_handler(self) -> Callable:
+        """Get the handler of this job."""
+        return self._handler
 
-    def get_message(self) -> Message:
-        """Get the message of this job."""
-        return self._context.message
+    def get_context(self) -> Optional[ChatContext]:
+        """Get the chat context of this job, None if it has no chat context."""
+        return self._context
+
+    def get_contexts(self) -> List[ChatContext]:
+        """Get the chat contexts that runs of the job can change."""
+        return [self._context] if self._context is not None else []
+
+    def get_message(self) -> Optional[Message]:
+        """Get the message of this job, None if it has no chat context."""
+        return self._context.message if self._context is not None else None
 
     def get_interval(self) -> int:
-        """Get the interval of the (repeating) job."""
-        if self._repeat:
-            if self._monthly:
-                now = datetime.now()
-                next_month = now + relativedelta(months=+1)
-                interval = next_month.timestamp() - now.timestamp()
-                return int(interval)
-            elif self._interval:
-                return self._interval
+        """Get the interval of the (repeating) job, derived from its schedule."""
+        if isinstance(self._schedule, IntervalSchedule):
+            return int(self._schedule.interval)
+        if self._schedule is not None:
+            now = time()
+            next_run = self._schedule.next_after(now)
+            if next_run is not None:
+                return int(next_run - now)
 
         return 0
 
+    def get_schedule(self) -> Optional[Schedule]:
+        """Get the schedule of the (repeating) job."""
+        return self._schedule
+
     def is_repeating(self) -> bool:
         """Check if the job is repeating."""
-        return self._repeat
+        return self._schedule is not None
+
+    def allows_overlap(self) -> bool:
+        """Check if a run of the job may start while an earlier run is running."""
+        return self._overlap
+
+    def is_running(self) -> bool:
+        """Check if the job is running."""
+        return self._running > 0
+
+    def get_timeout(self) -> Optional[float]:
+        """Get the timeout in seconds of a run of the job."""
+        return self._timeout
 
     def schedule_removal(self) -> None:
         """Schedule the job for removal from the job queue."""
         self._remove = True
+        if self._on_removal:
+            self._on_removal(self)
 
     def remove(self) -> bool:
         """Check if job should be removed."""
@@ -77,4 +131,97 @@ class Job(object):
 
     async def run(self) -> Optional[Reply]:
         """Run the job by calling the handler."""
-        return await self._handler(self._context)
+        self._running += 1
+        try:
+            return await self._handler(self._context)
+        finally:
+            self._running -= 1
+
+
+class SharedJob(Job):
+    """This object represents a repeating job shared by chat contexts.
+
+    The producer runs once per run of the job, its result is passed to the
+    callback of every subscribed chat context. Replies of the callbacks are
+    sent to their chat. A callback raising StopPropagation unsubscribes its
+    context, the job is removed when the last context unsubscribes. A run
+    of a failing producer is skipped.
+    """
+
+    def __init__(self,
+                 key: str,
+                 producer: Callable[[], Awaitable[Any]],
+                 sender: MessageSender,
+                 schedule: Schedule,
+                 overlap: bool = False,
+                 timeout: Optional[float] = None,
+                 on_removal: Optional[Callable[[Job], None]] = None) -> None:
+        """Initialize shared job."""
+        super().__init__(producer, None, overlap=overlap, timeout=timeout,
+                         on_removal=on_removal, schedule=schedule)
+        self.key: str = key
+        self._sender: MessageSender = sender
+        # Subscribed chat contexts and their callbacks by chat context id.
+        self._subscribers: Dict[str, Tuple[ChatContext, Callable]] = {}
+
+        self.log = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        """Get the number of subscribed chat contexts."""
+        return len(self._subscribers)
+
+    def subscribe(self, context: ChatContext, callback: Callable) -> None:
+        """Subscribe a chat context, the callback gets the context and the result."""
+        self._subscribers[context.get_id()] = (context, callback)
+
+    def unsubscribe(self, context: ChatContext) -> None:
+        """Unsubscribe a chat context, removing the job if it was the last one."""
+        self._subscribers.pop(context.get_id(), None)
+        if not self._subscribers and not self.remove():
+            self.schedule_removal()
+
+    def get_contexts(self) -> List[ChatContext]:
+        """Get the chat contexts of all subscribers."""
+        return [context for context, _ in self._subscribers.values()]
+
+    def is_subscribed(self, context: ChatContext) -> bool:
+        """Check if a chat context is subscribed."""
+        return context.get_id() in self._subscribers
+
+    async def _deliver(self,
+                       context: ChatContext,
+                       callback: Callable,
+                       result: Any) -> None:
+        """Pass the result to the callback of a subscriber and send its reply."""
+        try:
+            reply = await callback(context, result)
+            if reply:
+                await self._sender.reply_message(context.message, reply,
+                                                 SendScheduler.SCHEDULED)
+        except StopPropagation:
+            self.unsubscribe(context)
+        except Exception as exc:
+            self.log.warning(f"Shared job ({self.key}) failed for "
+                             f"{context.message.source.uuid}", exc_info=exc)
+
+    async def run(self) -> Optional[Reply]:
+        """Run the producer once and pass its result to all subscribers."""
+        if not self._subscribers:
+            return None
+
+        self._running += 1
+        try:
+            # A failing producer skips this run, the subscribers stay subscribed.
+            try:
+                result = await self._handler()
+            except Exception as exc:
+                self.log.warning(f"Shared job ({self.key}) producer failed",
+                                 exc_info=exc)
+                return None
+
+            async with anyio.create_task_group() as tg:
+                for context, callback in list(self._subscribers.values()):
+                    await tg.spawn(self._deliver, context, callback, result)
+        finally:
+            self._running -= 1
+        return None
@@ -20,38 +20,138 @@ from __future__ import annotations
 
 import logging
 from time import time
-from typing import Callable, TYPE_CHECKING
+from typing import (
+    Any, Awaitable, Callable, Dict, Match, Optional, TYPE_CHECKING, Union
+)
+from uuid import uuid4
 
-from anyio import sleep, WouldBlock
+import anyio
+from anyio import move_on_after, WouldBlock
 
 from .exceptions import StopPropagation
-from .job import Job
+from .job import Job, SharedJob
+from .job_store import (
+    create_job_record, get_callback_path, import_callback, JobStore, rematch
+)
+from .message import Message
 from .queue import PriorityQueue
+from .schedule import CronSchedule, IntervalSchedule, MonthlySchedule, Schedule
+from .send_scheduler import SendScheduler
+from .timing_wheel import TimingWheel
 
 if TYPE_CHECKING:
     from .chat_context import ChatContext
+    from .context_store import ContextStore
     from .message_sender import MessageSender
 
 
 class JobQueue:
     """This object represents a bot job queue."""
 
-    def __init__(self, sender: MessageSender) -> None:
+    def __init__(self,
+                 sender: MessageSender,
+                 max_concurrency: int = 16,
+                 job_timeout: Optional[float] = None,
+                 timing_wheel: bool = False,
+                 store: Optional[JobStore] = None,
+                 context_store: Optional[ContextStore] = None) -> None:
         """Initialize job queue."""
-        self._queue: PriorityQueue = PriorityQueue()
+        # A timing wheel frees removed jobs immediately, a heap when they are due.
+        self._queue: Union[PriorityQueue, TimingWheel] = (
+            TimingWheel() if timing_wheel else PriorityQueue()
+        )
         self._sender: MessageSender = sender
+        self._slots = anyio.Semaphore(max_concurrency)
+        self._job_timeout: Optional[float] = job_timeout
+        self._store: Optional[JobStore] = store
+        self._context_store: Optional[ContextStore] = context_store
+        self._shared: Dict[str, SharedJob] = {}
+
+        # Lateness in seconds of jobs, from their due time until they run.
+        self.jobs_run: int = 0
+        self.last_lateness: float = 0.0
+        self.max_lateness: float = 0.0
+        self.total_lateness: float = 0.0
 
         self.log = logging.getLogger(__name__)
 
+    def _create_job(self, callback: Callable, context: ChatContext, **kwargs: Any) -> Job:
+        """Create a job, with an id in the job store if it can be stored."""
+        job_id = None
+        if self._store is not None:
+            if get_callback_path(callback) is not None:
+                job_id = uuid4().hex
+            else:
+                self.log.warning(f"Job callback {callback} can not be imported, "
+                                 f"the job is not stored")
+        return Job(callback, context, on_removal=self._remove_job, job_id=job_id,
+                   **kwargs)
+
+    async def _schedule(self, timestamp: float, job: Job) -> None:
+        """Put a job in the queue and store it with its next run."""
+        await self._queue.put_nowait(timestamp, job)
+        job_id = job.get_id()
+        if self._store is not None and job_id is not None:
+            record = create_job_record(job, timestamp)
+            if record is not None:
+                self._store.put(job_id, record)
+
+    def _remove_job(self, job: Job) -> None:
+        """Remove a job from the queue and the job store."""
+        self._queue.remove(job)
+        job_id = job.get_id()
+        if self._store is not None and job_id is not None:
+            self._store.remove(job_id)
+
+    async def restore(self,
+                      create_context: Callable[[Message, Match],
+                                               Awaitable[ChatContext]]) -> int:
+        """Put the jobs of the job store in the queue, returns the number of jobs."""
+        if self._store is None:
+            return 0
+
+        now = time()
+        restored = 0
+        for record in await self._store.load():
+            job_id = record["id"]
+            try:
+                callback = import_callback(record["callback"])
+            except (ImportError, AttributeError) as exc:
+                self.log.error(f"Restoring job ({job_id}) failed", exc_info=exc)
+                continue
+
+            timestamp = self._store.reschedule(record, now)
+            if timestamp is None:
+                self._store.remove(job_id)
+                self.log.info(f"Skipped missed job ({job_id})")
+                continue
+
+            schedule = (Schedule.create_from_dict(record["schedule"])
+                        if record["schedule"] is not None else None)
+            message = Message.create_from_receive_dict(record["message"], self._sender)
+            context = await create_context(message, rematch(record, message.get_body()))
+            job = Job(callback, context,
+                      schedule=schedule,
+                      overlap=record["overlap"],
+                      timeout=record["timeout"],
+                      on_removal=self._remove_job,
+                      job_id=job_id)
+            await self._schedule(timestamp, job)
+            restored += 1
+
+        self.log.info(f"Restored {restored} jobs from the job store")
+        return restored
+
     async def run_once(
         self,
         timestamp: float,
         callback: Callable,
         context: ChatContext,
+        timeout: Optional[float] = None,
     ) -> Job:
         """Add a job to the queue that runs once."""
-        job = Job(callback, context)
-        await self._queue.put_nowait(timestamp, job)
+        job = self._create_job(callback, context, timeout=timeout)
+        await self._schedule(timestamp, job)
         self.log.info(f"Put job ({id(job)}) in the queue")
         return job
 
@@ -59,73 +159,246 @@ class JobQueue:
                             timestamp: float,
                             callback: Callable,
                             context: ChatContext,
-                            interval: int) -> Job:
+                            interval: int,
+                            overlap: bool = True,
+                            timeout: Optional[float] = None) -> Job:
         """Add a job to the queue that runs repeating."""
-        job = Job(callback, context, repeat=True, interval=interval)
-        await self._queue.put_nowait(timestamp, job)
+        job = self._create_job(callback, context,
+                               schedule=IntervalSchedule(interval, timestamp),
+                               overlap=overlap, timeout=timeout)
+        await self._schedule(timestamp, job)
         self.log.info(f"Put repeating job ({id(job)}) in the queue")
         return job
 
     async def run_daily(self,
                         timestamp: float,
                         callback: Callable,
-                        context: ChatContext) -> Job:
+                        context: ChatContext,
+                        overlap: bool = True,
+                        timeout: Optional[float] = None) -> Job:
         """Add a job to the queue that runs daily."""
         interval = 60 * 60 * 24  # Day
-        job = Job(callback, context, repeat=True, interval=interval)
-        await self._queue.put_nowait(timestamp, job)
+        job = self._create_job(callback, context,
+                               schedule=IntervalSchedule(interval, timestamp),
+                               overlap=overlap, timeout=timeout)
+        await self._schedule(timestamp, job)
         self.log.info(f"Put daily job ({id(job)}) in the queue")
         return job
 
     async def run_monthly(self,
                           timestamp: float,
                           callback: Callable,
-                          context: ChatContext) -> Job:
+                          context: ChatContext,
+                          overlap: bool = True,
+                          timeout: Optional[float] = None) -> Job:
         """Add a job to the queue that runs monthly."""
-        job = Job(callback, context, repeat=True, monthly=True)
-        await self._queue.put_nowait(timestamp, job)
+        job = self._create_job(callback, context,
+                               schedule=MonthlySchedule(timestamp),
+                               overlap=overlap, timeout=timeout)
+        await self._schedule(timestamp, job)
         self.log.info(f"Put monthly job ({id(job)}) in the queue")
         return job
 
-    async def start(self) -> None:
-        """Run all the jobs in the queue that are due."""
-        self.log.info("Job queue started")
+    async def run_schedule(self,
+                           schedule: Schedule,
+                           callback: Callable,
+                           context: ChatContext,
+                           timestamp: Optional[float] = None,
+                           overlap: bool = True,
+                           timeout: Optional[float] = None) -> Job:
+        """Add a job to the queue that runs on a schedule.
 
-        while True:
-            now = time()
+        :param schedule:  The schedule of the job
+        :param callback:  The callback to run
+        :param context:   The chat context of the job
+        :param timestamp: Optional first run, the first run of the schedule by default
+        :param overlap:   Indicates if runs may start while an earlier run is running
+        :param timeout:   Optional timeout in seconds of a run
 
-            try:
-                timestamp, job = self._queue.get_nowait()
-            except WouldBlock:
-                await sleep(1)
-                continue
+        :raises ValueError: If the schedule has no runs
 
-            if timestamp > now:
-                await self._queue.put_nowait(timestamp, job)
-                await sleep(1)
-                continue
+        :return: Returns the job
+        :rtype: Job
+        """
+        if timestamp is None:
+            timestamp = schedule.next_after(time())
+            if timestamp is None:
+                raise ValueError("Schedule has no runs")
 
-            if job.remove():
-                self.log.info(f"Removed job ({id(job)}) from queue")
-                continue
+        job = self._create_job(callback, context, schedule=schedule,
+                               overlap=overlap, timeout=timeout)
+        await self._schedule(timestamp, job)
+        self.log.info(f"Put scheduled job ({id(job)}) in the queue")
+        return job
+
+    async def run_cron(self,
+                       expression: str,
+                       callback: Callable,
+                       context: ChatContext,
+                       timezone: Optional[str] = None,
+                       overlap: bool = True,
+                       timeout: Optional[float] = None) -> Job:
+        """Add a job to the queue that runs on a cron expression, like "0 9 * * 1-5".
+
+        :param expression: The cron expression of the job
+        :param callback:   The callback to run
+        :param context:    The chat context of the job
+        :param timezone:   Optional time zone of the expression, local time by default
+        :param overlap:    Indicates if runs may start while an earlier run is running
+        :param timeout:    Optional timeout in seconds of a run
+
+        :return: Returns the job
+        :rtype: Job
+        """
+        schedule = CronSchedule.get(expression, timezone)
+        return await self.run_schedule(schedule, callback, context,
+                                       overlap=overlap, timeout=timeout)
+
+    async def run_shared(self,
+                         key: str,
+                         timestamp: float,
+                         producer: Callable[[], Awaitable[Any]],
+                         interval: float,
+                         schedule: Optional[Schedule] = None,
+                         overlap: bool = False,
+                         timeout: Optional[float] = None) -> SharedJob:
+        """Get the shared job with a key, adding it to the queue if it does not exist.
+
+        :param key:       The key of the shared job
+        :param timestamp: The first run of the job
+        :param producer:  The producer to run once per run of the job
+        :param interval:  The interval in seconds of the runs
+        :param schedule:  Optional schedule of the runs, instead of the interval
+        :param overlap:   Indicates if runs may start while an earlier run is running
+        :param timeout:   Optional timeout in seconds of a run
+
+        :return: Returns the shared job, subscribe chat contexts to it
+        :rtype: SharedJob
+        """
+        job = self._shared.get(key)
+        if job is not None:
+            return job
+
+        job = SharedJob(key, producer, self._sender,
+                        schedule or IntervalSchedule(interval, timestamp),
+                        overlap=overlap, timeout=timeout,
+                        on_removal=self._remove_shared)
+        self._shared[key] = job
+        await self._queue.put_nowait(timestamp, job)
+        self.log.info(f"Put shared job ({key}) in the queue")
+        return job
+
+    def get_shared(self, key: str) -> Optional[SharedJob]:
+        """Get the shared job with a key, None if it does not exist."""
+        return self._shared.get(key)
+
+    def _remove_shared(self, job: Job) -> None:
+        """Remove a shared job from the queue."""
+        self._queue.remove(job)
+        if isinstance(job, SharedJob) and self._shared.get(job.key) is job:
+            del self._shared[job.key]
+
+    def mean_lateness(self) -> float:
+        """Get the mean lateness in seconds of jobs that ran."""
+        return self.total_lateness / self.jobs_run if self.jobs_run else 0.0
+
+    async def _put_contexts(self, job: Job) -> None:
+        """Put the chat contexts of a job in the context store after a run."""
+        if self._context_store is None:
+            return
+
+        for context in job.get_contexts():
+            # Skip contexts replaced in the store since the job got them.
+            context_id = context.get_id()
+            stored = await self._context_store.get(context_id)
+            if stored is None or stored is context:
+                await self._context_store.put(context_id, context)
+
+    async def _run_job(self, job: Job, timestamp: float) -> None:
+        """Run a job and send its reply, holding a slot of the worker pool."""
+        try:
+            lateness = time() - timestamp
+            self.jobs_run += 1
+            self.last_lateness = lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.total_lateness += lateness
 
             self.log.info(f"Running job ({id(job)})")
             message = job.get_message()
+            timeout = job.get_timeout() or self._job_timeout
             try:
-                reply = await job.run()
-                if reply:
-                    await self._sender.reply_message(message, reply)
-                    self.log.info(f"Reply for job ({id(job)}) "
-                                  f"sent to {message.source.uuid}")
+                with anyio.fail_after(timeout):
+                    reply = await job.run()
+                    if reply and message is not None:
+                        await self._sender.reply_message(message, reply,
+                                                         SendScheduler.SCHEDULED)
+                        self.log.info(f"Reply for job ({id(job)}) "
+                                      f"sent to {message.source.uuid}")
             except StopPropagation:
-                continue
+                job.schedule_removal()
+            except TimeoutError:
+                self.log.warning(f"Job ({id(job)}) timed out after {timeout} seconds")
+                # A failing run of a shared job is skipped, its subscribers stay.
+                if not isinstance(job, SharedJob):
+                    job.schedule_removal()
             except Exception as exc:
-                self.log.warning(f"Sending reply for message ({id(message)}) "
-                                 f"to {message.source.uuid} failed",
+                self.log.warning(f"Running job ({id(job)}) failed", exc_info=exc)
+                if not isinstance(job, SharedJob):
+                    job.schedule_removal()
+        finally:
+            try:
+                await self._put_contexts(job)
+            except Exception as exc:
+                self.log.warning(f"Storing chat contexts of job ({id(job)}) failed",
                                  exc_info=exc)
-                continue
+            if not job.is_repeating():
+                self._remove_job(job)
+            self._slots.release()
+
+    async def start(self) -> None:
+        """Run all the jobs in the queue that are due."""
+        self.log.info("Job queue started")
+
+        async with anyio.create_task_group() as tg:
+            while True:
+                try:
+                    timestamp, job = self._queue.peek()
+                except WouldBlock:
+                    await self._queue.wait_head_changed()
+                    continue
+
+                if job.remove():
+                    self._queue.get_nowait()
+                    self.log.info(f"Removed job ({id(job)}) from queue")
+                    continue
+
+                # Sleep until the job is due, or an earlier job is put in the queue.
+                now = time()
+                delay = timestamp - now
+                if delay > 0:
+                    with move_on_after(delay):
+                        await self._queue.wait_head_changed()
+                    continue
+
+                # Schedule the next run before running, runs may take a while.
+                self._queue.get_nowait()
+                schedule = job.get_schedule()
+                if schedule is not None:
+                    # Runs missed while running late are skipped.
+                    next_timestamp = schedule.next_after(timestamp)
+                    if next_timestamp is not None and next_timestamp <= now:
+                        next_timestamp = schedule.next_after(now)
+
+                    if next_timestamp is not None:
+                        await self._schedule(next_timestamp, job)
+                        self.log.info(f"Added repeating job ({id(job)}) to the queue")
+                    else:
+                        self._remove_job(job)
+
+                if job.is_running() and not job.allows_overlap():
+                    self.log.info(f"Skipped job ({id(job)}), it is still running")
+                    continue
 
-            if job.is_repeating():
-                interval = job.get_interval()
-                await self._queue.put_nowait(now + interval, job)
-                self.log.info(f"Added repeating job ({id(job)}) to the queue")
+                # Wait for a free slot in the worker pool.
+                await self._slots.acquire()
+                await tg.spawn(self._run_job, job, timestamp)
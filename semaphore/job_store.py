@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that persist jobs of the job queue."""
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Match, Optional, Tuple, TYPE_CHECKING
+
+import anyio
+import anyio.to_thread
+
+from .schedule import Schedule
+
+if TYPE_CHECKING:
+    from .job import Job
+    from .message import Message
+
+
+def get_callback_path(callback: Callable) -> Optional[str]:
+    """Get the import path of a callback, None if it can not be imported."""
+    # Bound methods import without their instance.
+    if inspect.ismethod(callback):
+        return None
+    module = getattr(callback, "__module__", None)
+    qualname = getattr(callback, "__qualname__", None)
+    if module is None or qualname is None or "<locals>" in qualname:
+        return None
+    return f"{module}:{qualname}"
+
+
+def import_callback(path: str) -> Callable:
+    """Import a callback by its import path."""
+    module, _, qualname = path.partition(":")
+    callback: Any = import_module(module)
+    for name in qualname.split("."):
+        callback = getattr(callback, name)
+    return callback
+
+
+def create_message_reference(message: Message) -> Dict[str, Any]:
+    """Create a reference to a message in the format signald delivers messages."""
+    data_message: Dict[str, Any] = {
+        "timestamp": message.timestamp,
+        "body": message.get_body(),
+    }
+    if message.data_message is not None:
+        if message.data_message.groupV2 is not None:
+            data_message["groupV2"] = {"id": message.data_message.groupV2.id}
+        elif message.data_message.group is not None:
+            data_message["group"] = {"groupId": message.data_message.group.group_id}
+
+    source = {"uuid": message.source.uuid}
+    if message.source.number is not None:
+        source["number"] = message.source.number
+
+    return {
+        "account": message.username,
+        "source": source,
+        "type": message.envelope_type,
+        "timestamp": message.timestamp,
+        "server_receiver_timestamp": message.server_timestamp,
+        "data_message": data_message,
+    }
+
+
+def create_job_record(job: Job, timestamp: float) -> Optional[Dict[str, Any]]:
+    """Create the record of a job, None if the job can not be stored."""
+    callback = get_callback_path(job.get_handler())
+    if callback is None:
+        return None
+
+    context = job.get_context()
+    if context is None:
+        return None
+
+    match = context.match
+    schedule = job.get_schedule()
+    return {
+        "id": job.get_id(),
+        "callback": callback,
+        "timestamp": timestamp,
+        "schedule": schedule.to_dict() if schedule is not None else None,
+        "overlap": job.allows_overlap(),
+        "timeout": job.get_timeout(),
+        "message": create_message_reference(context.message),
+        "pattern": match.re.pattern if match is not None else None,
+        "flags": match.re.flags if match is not None else 0,
+    }
+
+
+def rematch(record: Dict[str, Any], body: str) -> Match:
+    """Match the body of the message of a job record against its pattern again."""
+    match = None
+    if record["pattern"] is not None:
+        match = re.search(record["pattern"], body, record["flags"])
+    return match or re.match("", body)  # type: ignore[return-value]
+
+
+class JobStore(ABC):
+    """This object represents a store for jobs of the job queue.
+
+    Subclass this object to persist jobs elsewhere. Jobs are stored as JSON
+    serializable records with the import path of the callback, the schedule
+    and a reference to the message of the chat context. Jobs missed while the
+    bot was not running are run once right away with the CATCH_UP policy, with
+    the SKIP policy they are dropped or scheduled at their next run.
+    """
+
+    CATCH_UP: str = "catch_up"
+    SKIP: str = "skip"
+
+    def __init__(self, misfire_policy: str = CATCH_UP) -> None:
+        """Initialize job store."""
+        if misfire_policy not in (self.CATCH_UP, self.SKIP):
+            raise ValueError(f"Unknown misfire policy: {misfire_policy}")
+        self.misfire_policy: str = misfire_policy
+
+    @abstractmethod
+    def put(self, job_id: str, record: Dict[str, Any]) -> None:
+        """Put the record of a job in the store."""
+
+    @abstractmethod
+    def remove(self, job_id: str) -> None:
+        """Remove the record of a job from the store."""
+
+    @abstractmethod
+    async def load(self) -> List[Dict[str, Any]]:
+        """Load the records of all stored jobs."""
+
+    def reschedule(self, record: Dict[str, Any], now: float) -> Optional[float]:
+        """Get the timestamp to schedule a loaded job at, None to drop the job."""
+        timestamp: float = record["timestamp"]
+        if timestamp >= now:
+            return timestamp
+        if self.misfire_policy == self.CATCH_UP:
+            return now
+        if record["schedule"] is None:
+            return None
+        return Schedule.create_from_dict(record["schedule"]).next_after(now)
+
+    async def start(self) -> None:
+        """Run background work of the store, like flushing jobs."""
+
+    async def close(self) -> None:
+        """Close the store, flushing pending changes."""
+
+
+class SQLiteJobStore(JobStore):
+    """This object represents a job store persisted in SQLite.
+
+    Changed jobs are written to the database in batches every flush_interval
+    seconds and when the store is closed. Database access runs in a worker
+    thread.
+    """
+
+    def __init__(self,
+                 path: str,
+                 misfire_policy: str = JobStore.CATCH_UP,
+                 flush_interval: float = 1.0) -> None:
+        """Initialize SQLite job store."""
+        super().__init__(misfire_policy)
+        self._path: str = path
+        self._flush_interval: float = flush_interval
+        self._connection: Optional[sqlite3.Connection] = None
+        self._db_lock = anyio.Lock()
+        # Changed job records by id, None for removed jobs.
+        self._dirty: Dict[str, Optional[Dict[str, Any]]] = {}
+
+        self.log = logging.getLogger(__name__)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the database, creating the table if needed."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS job ("
+                "id TEXT PRIMARY KEY, record TEXT NOT NULL, next_run REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _write(self,
+               updates: List[Tuple[str, str, float]],
+               removals: List[Tuple[str]]) -> None:
+        """Write job records to the database."""
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO job (id, record, next_run) VALUES (?, ?, ?)",
+                updates
+            )
+            connection.executemany("DELETE FROM job WHERE id = ?", removals)
+
+    def _read(self) -> List[str]:
+        """Read all job records from the database."""
+        rows = self._connect().execute("SELECT record FROM job ORDER BY next_run")
+        return [row[0] for row in rows]
+
+    def put(self, job_id: str, record: Dict[str, Any]) -> None:
+        """Put the record of a job in the store and mark it for flushing."""
+        self._dirty[job_id] = record
+
+    def remove(self, job_id: str) -> None:
+        """Remove the record of a job from the store and the database."""
+        self._dirty[job_id] = None
+
+    async def load(self) -> List[Dict[str, Any]]:
+        """Load the records of all stored jobs."""
+        await self.flush()
+        async with self._db_lock:
+            records = await anyio.to_thread.run_sync(self._read)
+        return [json.loads(record) for record in records]
+
+    async def flush(self) -> None:
+        """Write all changed jobs to the database."""
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        updates = [(job_id, json.dumps(record), record["timestamp"])
+                   for job_id, record in dirty.items() if record is not None]
+        removals = [(job_id,) for job_id, record in dirty.items() if record is None]
+
+        try:
+            async with self._db_lock:
+                await anyio.to_thread.run_sync(self._write, updates, removals)
+        except Exception:
+            # Keep the jobs for the next flush, unless they changed since.
+            for job_id, record in dirty.items():
+                self._dirty.setdefault(job_id, record)
+            raise
+        self.log.debug(f"Flushed {len(updates)} jobs, removed {len(removals)}")
+
+    async def start(self) -> None:
+        """Flush changed jobs periodically."""
+        while True:
+            await anyio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                self.log.error("Flushing jobs failed", exc_info=exc)
+
+    async def close(self) -> None:
+        """Flush changed jobs and close the database."""
+        await self.flush()
+        if self._connection is not None:
+            async with self._db_lock:
+                await anyio.to_thread.run_sync(self._connection.close)
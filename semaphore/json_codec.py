@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that encode and decode signald JSON messages."""
+import json
+from typing import Any
+
+
+class JsonCodec:
+    """This object represents a JSON codec using the standard library.
+
+    Subclass this object to use another JSON library. Messages are encoded
+    to and decoded from UTF-8 bytes, decoding raises a ValueError on
+    invalid JSON.
+    """
+
+    def encode(self, obj: Any) -> bytes:
+        """Encode an object to JSON bytes."""
+        return json.dumps(obj).encode("utf8")
+
+    def decode(self, data: bytes) -> Any:
+        """Decode JSON bytes to an object."""
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """This object represents a JSON codec using orjson.
+
+    Requires the optional orjson package (pip install semaphore-bot[orjson]).
+    """
+
+    def __init__(self) -> None:
+        """Initialize orjson codec."""
+        import orjson  # type: ignore
+
+        self._orjson = orjson
+
+    def encode(self, obj: Any) -> bytes:
+        """Encode an object to JSON bytes."""
+        return self._orjson.dumps(obj)
+
+    def decode(self, data: bytes) -> Any:
+        """Decode JSON bytes to an object."""
+        return self._orjson.loads(data)
@@ -16,16 +16,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """This module contains an object that represents a Signal message link preview."""
-import logging
-import re
-from typing import Dict, Optional
+from typing import Dict
 
 import attr
 
 from .attachment import Attachment
+from .model_codec import ModelCodec
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class LinkPreview:
     """This object represents a Signal message link preview.
 
@@ -47,9 +46,8 @@ class LinkPreview:
 
     @staticmethod
     def create_from_receive_dict(data: dict) -> 'LinkPreview':
-        processed_data = data.copy()
-        if 'attachment' in processed_data:
-            attachment = Attachment.create_from_receive_dict(data['attachment'])
-            processed_data['attachment'] = attachment
+        return _CODEC.decode(data)
 
-        return LinkPreview(**processed_data)
+
+_CODEC = ModelCodec(LinkPreview, camel_case=False,
+                    decoders={"attachment": Attachment.create_from_receive_dict})
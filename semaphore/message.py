@@ -18,7 +18,7 @@
 """This module contains an object that represents a Signal message."""
 from __future__ import annotations
 
-from typing import List, Optional, TYPE_CHECKING
+from typing import Any, cast, Dict, List, Optional, TYPE_CHECKING
 
 import attr
 
@@ -34,7 +34,7 @@ if TYPE_CHECKING:
     from .profile import Profile
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Message:
     """This object represents a Signal message."""
 
@@ -45,12 +45,30 @@ class Message:
     server_timestamp: int
     _sender: MessageSender
     source_device: int = attr.ib(default=0)
-    relay: str = attr.ib(default=None)
+    relay: Optional[str] = attr.ib(default=None)
     has_legacy_message: bool = attr.ib(default=False)
     has_content: bool = attr.ib(default=False)
     data_message: Optional[DataMessage] = attr.ib(default=None)
     is_unidentified_sender: bool = attr.ib(default=False)
 
+    @staticmethod
+    def create_from_receive_dict(data: dict, sender: MessageSender) -> 'Message':
+        data_message = data.get("data_message")
+        return Message(
+            username=data["account"],
+            source=Address.create_from_receive_dict(data["source"]),
+            envelope_type=data["type"],
+            timestamp=data["timestamp"],
+            server_timestamp=data["server_receiver_timestamp"],
+            source_device=data.get("source_device", 0),
+            relay=data.get("relay"),
+            has_legacy_message=data.get("has_legacy_message", False),
+            is_unidentified_sender=data.get("unidentified_sender", False),
+            data_message=(DataMessage.create_from_receive_dict(data_message)
+                          if data_message else None),
+            sender=sender,
+        )
+
     def empty(self) -> bool:
         """Check if the message is not empty."""
         if self.data_message:
@@ -81,6 +99,12 @@ class Message:
                 return self.data_message.group.group_id
         return None
 
+    def get_group_revision(self) -> Optional[int]:
+        """Get the group revision if message is a group v2 message."""
+        if self.data_message and self.data_message.groupV2:
+            return self.data_message.groupV2.revision
+        return None
+
     async def reply(self,
                     body: str,
                     attachments: List[Attachment] = [],
@@ -119,3 +143,116 @@ class Message:
     async def get_profile(self) -> Profile:
         """Get Signal profile of message sender."""
         return await self._sender.get_profile(self)
+
+    def load(self) -> None:
+        """Build all parts of the message, to keep it without its received data."""
+
+
+class LazyMessage(Message):
+    """This object represents a Signal message that is built on first access.
+
+    The source address and data message are only created from the received
+    data when they are accessed. Matching the body and getting the group id
+    does not create them. Once both are created the received data is
+    dropped, load creates them to keep a message compact.
+    """
+
+    __slots__ = ('_data', '_source', '_data_message')
+
+    def __init__(self, data: Dict, sender: MessageSender) -> None:
+        """Initialize lazy message."""
+        self._data: Optional[Dict] = data
+        self._source: Optional[Address] = None
+        self._data_message: Optional[DataMessage] = None
+        self._sender = sender
+        self.username = data["account"]
+        self.envelope_type = data["type"]
+        self.timestamp = data["timestamp"]
+        self.server_timestamp = data["server_receiver_timestamp"]
+        self.source_device = data.get("source_device", 0)
+        self.relay = data.get("relay")
+        self.has_legacy_message = data.get("has_legacy_message", False)
+        self.has_content = False
+        self.is_unidentified_sender = data.get("unidentified_sender", False)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Get the state of the message for copying and pickling."""
+        # The source and data message are properties, their values are in slots.
+        names = [field.name for field in attr.fields(Message)
+                 if field.name not in ("source", "data_message")]
+        return {name: getattr(self, name) for name in names + list(self.__slots__)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore the state of a copied or pickled message."""
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def _get_raw_data_message(self) -> Optional[Dict]:
+        """Get the received data message, None if it was dropped or is missing."""
+        return self._data.get("data_message") if self._data is not None else None
+
+    def _release(self) -> None:
+        """Drop the received data when the source and data message are created."""
+        if self._data is not None and self._source is not None and \
+                (self._data_message is not None or not self._get_raw_data_message()):
+            self._data = None
+
+    @property
+    def source(self) -> Address:  # type: ignore[override]
+        """Get the source address of the message."""
+        if self._source is None:
+            # The received data is only dropped after the source was created.
+            data = cast(Dict, self._data)
+            self._source = Address.create_from_receive_dict(data["source"])
+            self._release()
+        return self._source
+
+    @property
+    def data_message(self) -> Optional[DataMessage]:  # type: ignore[override]
+        """Get the data message of the message."""
+        if self._data_message is None:
+            data = self._get_raw_data_message()
+            if not data:
+                return None
+            self._data_message = DataMessage.create_from_receive_dict(data)
+            self._release()
+        return self._data_message
+
+    def load(self) -> None:
+        """Build all parts of the message, to keep it without its received data."""
+        self.source
+        self.data_message
+
+    def empty(self) -> bool:
+        """Check if the message is not empty."""
+        return self.get_body() == ""
+
+    def get_body(self) -> str:
+        """Check if the message is not empty."""
+        if self._data is None:
+            return (self._data_message.body if self._data_message else None) or ""
+        data = self._get_raw_data_message()
+        if data:
+            return data.get("body") or ""
+        return ""
+
+    def get_group_id(self) -> Optional[str]:
+        """Get group id if message is a group message."""
+        if self._data is None:
+            return super().get_group_id()
+        data = self._get_raw_data_message()
+        if data:
+            if data.get("groupV2"):
+                return data["groupV2"]["id"]
+            if data.get("group"):
+                return data["group"].get("groupId")
+        return None
+
+    def get_group_revision(self) -> Optional[int]:
+        """Get the group revision if message is a group v2 message."""
+        if self._data is None:
+            return super().get_group_revision()
+        data = self._get_raw_data_message()
+        if data and data.get("groupV2"):
+            return data["groupV2"].get("revision")
+        return None
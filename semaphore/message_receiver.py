@@ -20,18 +20,11 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import AsyncIterable, Dict, Optional, TYPE_CHECKING
+from typing import AsyncIterable, Dict, FrozenSet, Optional, TYPE_CHECKING
 
-from .address import Address
-from .attachment import Attachment
-from .data_message import DataMessage
-from .group import Group
-from .groupV2 import GroupV2
-from .link_preview import LinkPreview
-from .mention import Mention
-from .message import Message
-from .sticker import Sticker
-from .sticker_pack import StickerPack
+from .exceptions import ListenerStoppedError
+from .json_codec import JsonCodec
+from .message import LazyMessage, Message
 
 
 if TYPE_CHECKING:
@@ -42,23 +35,59 @@ if TYPE_CHECKING:
 class MessageReceiver:
     """This object represents a Signal message queue."""
 
-    def __init__(self, socket: Socket, sender: MessageSender):
+    # Envelope types the receiver acts on, all other envelopes are skipped.
+    ENVELOPE_TYPES: FrozenSet[bytes] = frozenset({b"IncomingMessage", b"ListenerState"})
+    # Start of a compact signald envelope, the envelope type follows.
+    _TYPE_PREFIX: bytes = b'{"type":"'
+
+    def __init__(self,
+                 socket: Socket,
+                 sender: MessageSender,
+                 codec: Optional[JsonCodec] = None,
+                 data_messages_only: bool = False,
+                 lazy: bool = True):
         """Initialize message receiver."""
         self._socket: Socket = socket
         self._sender: MessageSender = sender
+        self._codec: JsonCodec = codec or JsonCodec()
+        self._data_messages_only: bool = data_messages_only
+        self._lazy: bool = lazy
+        self.envelopes_decoded: int = 0
+        self.envelopes_skipped: int = 0
         self.log = logging.getLogger(__name__)
 
+    def _skip(self, line: bytes) -> bool:
+        """Check if a raw envelope can be skipped without decoding it."""
+        # Always decode envelopes reporting an exception, these are logged.
+        if not line.startswith(self._TYPE_PREFIX) or b'"exception"' in line:
+            return False
+
+        end = line.find(b'"', len(self._TYPE_PREFIX))
+        envelope_type = line[len(self._TYPE_PREFIX):end]
+        if envelope_type not in self.ENVELOPE_TYPES:
+            return True
+
+        # Receipts and typing notifications are incoming messages without data.
+        if self._data_messages_only and envelope_type == b"IncomingMessage":
+            return b'"data_message"' not in line
+        return False
+
     async def receive(self) -> AsyncIterable[Message]:
         """Receive messages and return as Iterator."""
-        async for raw_line in self._socket.read():
-            line: str = raw_line.decode()
-            self.log.debug(f'Socket receive: {line}')
+        async for line in self._socket.read():
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug(f'Socket receive: {line.decode()}')
+
+            if self._skip(line):
+                self.envelopes_skipped += 1
+                continue
+            self.envelopes_decoded += 1
 
             # Load Signal message wrapper
             try:
                 message_wrapper: Dict
-                message_wrapper = json.loads(line)
-            except json.JSONDecodeError:
+                message_wrapper = self._codec.decode(line)
+            except ValueError:
                 continue
 
             # Handle Errors
@@ -71,76 +100,33 @@ class MessageReceiver:
                 if data and not data.get("connected"):
                     self.log.warning(f"Signald won't deliver new messages: "
                                      f"{message_wrapper}")
-                    raise ValueError("Signald: listen stopped")
+                    raise ListenerStoppedError("Signald: listen stopped")
 
             # Only handle messages.
             if message_wrapper["type"] != "IncomingMessage":
                 continue
 
+            message = message_wrapper["data"]
+            data_message = message.get("data_message")
+            if self._data_messages_only and not data_message:
+                continue
+
+            # Let the sender invalidate its cache of a changed group.
+            group = data_message.get("groupV2") if data_message else None
+            if group:
+                self._sender.observe_group(group["id"], group.get("revision"))
+
             try:
-                message = message_wrapper["data"]
-                data_message: Optional[DataMessage] = None
-                data = message.get("data_message")
-                if data:
-                    group: Optional[Group] = None
-                    groupV2: Optional[GroupV2] = None
-                    if data.get("group"):
-                        group = Group(
-                            group_id=data["group"].get("groupId"),
-                            name=data["group"].get("name"),
-                            group_type=data["group"].get("type"),
-                        )
-                    if data.get("groupV2"):
-                        groupV2 = GroupV2.create_from_receive_dict(data["groupV2"])
-
-                    sticker_data = data.get("sticker")
-                    sticker: Optional[Sticker] = None
-                    if sticker_data:
-                        pack = StickerPack(
-                            pack_id=sticker_data["packID"],
-                            pack_key=sticker_data["packKey"],
-                        )
-                        sticker = Sticker(
-                            sticker_id=sticker_data["stickerID"],
-                            pack=pack,
-                        )
-
-                    data_message = DataMessage(
-                        timestamp=data["timestamp"],
-                        body=data.get("body", ""),
-                        expires_in_seconds=data.get("expiresInSeconds"),
-                        attachments=[
-                            Attachment.create_from_receive_dict(attachment)
-                            for attachment in data.get("attachments", [])
-                        ],
-                        mentions=[
-                            Mention.create_from_receive_dict(mention)
-                            for mention in data.get("mentions", [])
-                        ],
-                        previews=[
-                            LinkPreview.create_from_receive_dict(link_preview)
-                            for link_preview in data.get("previews", [])
-                        ],
-                        group=group,
-                        groupV2=groupV2,
-                        sticker=sticker,
-                    )
-
-                yield Message(
-                    username=message["account"],
-                    source=Address.create_from_receive_dict(message["source"]),
-                    envelope_type=message["type"],
-                    timestamp=message["timestamp"],
-                    server_timestamp=message["server_receiver_timestamp"],
-                    source_device=message.get("source_device"),
-                    relay=message.get("relay"),
-                    has_legacy_message=message.get("has_legacy_message"),
-                    is_unidentified_sender=message.get("unidentified_sender"),
-                    data_message=data_message,
-                    sender=self._sender,
-                )
+                received: Message
+                if self._lazy:
+                    received = LazyMessage(message, self._sender)
+                else:
+                    received = Message.create_from_receive_dict(message, self._sender)
             except Exception as exc:
                 self.log.error(
                     f"Could not receive message: {json.dumps(message)}",
                     exc_info=exc,
                 )
+                continue
+
+            yield received
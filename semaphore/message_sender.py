@@ -19,17 +19,25 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
 import re
-from typing import Any, Dict, List, Optional, TYPE_CHECKING, Union
+from collections import OrderedDict
+from time import monotonic, time
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+import anyio
 
 from .exceptions import IDENTIFIABLE_SIGNALD_ERRORS, UnknownError
 from .groupV2 import GroupV2
+from .json_codec import JsonCodec
 from .message import Message
 from .profile import Profile
+from .rate_limiter import get_retry_after, RateLimiter
 from .reply import Reply
+from .retry import RetryPolicy
+from .send_scheduler import SendScheduler
 from .socket import Socket
+from .socket_pool import SocketPool
 
 if TYPE_CHECKING:
     from .attachment import Attachment
@@ -40,136 +48,325 @@ class MessageSender:
     """This class handles sending bot messages."""
     signald_message_id: int = 0
 
-    def __init__(self, username: str, socket: Socket, raise_errors: bool = False):
+    # Request types for which the caller waits on the signald response.
+    RESPONSE_TYPES = {"send", "get_profile", "get_group", "list_groups", "update_group",
+                      "create_group", "leave_group", "group_link_info"}
+
+    # Request types that are limited by the rate limiter.
+    LIMITED_TYPES = {"send", "react"}
+
+    def __init__(self,
+                 username: str,
+                 pool: SocketPool,
+                 raise_errors: bool = False,
+                 codec: Optional[JsonCodec] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 scheduler: Optional[SendScheduler] = None,
+                 profile_cache_ttl: float = 300.0,
+                 profile_cache_size: int = 1024):
         """Initialize message sender."""
         self._username: str = username
-        self._socket: Socket = socket
+        self._pool: SocketPool = pool
         self._raise_signald_errors = raise_errors
-        self._socket_lock = asyncio.Lock()
+        self._codec: JsonCodec = codec or JsonCodec()
+        self._rate_limiter: Optional[RateLimiter] = rate_limiter
+        self._retry_policy: Optional[RetryPolicy] = retry_policy
+        self._scheduler: SendScheduler = scheduler or SendScheduler()
+
+        # Cached groups, the newest revision seen of every group and whether
+        # the cache holds all groups of the account.
+        self._groups: Dict[str, GroupV2] = {}
+        self._group_revisions: Dict[str, int] = {}
+        self._groups_listed: bool = False
+        self.group_cache_hits: int = 0
+        self.group_cache_misses: int = 0
+
+        # Cached profiles by uuid with their expiry time, least recently used
+        # first, and the profile requests in flight.
+        self._profile_cache_ttl: float = profile_cache_ttl
+        self._profile_cache_size: int = profile_cache_size
+        self._profiles: OrderedDict[str, Tuple[float, Profile]] = OrderedDict()
+        self._profile_requests: Dict[str, asyncio.Future] = {}
+        self.profile_cache_hits: int = 0
+        self.profile_cache_misses: int = 0
+        self._pending: Dict[str, Tuple[Socket, asyncio.Future]] = {}
+        self._readers: Dict[Socket, asyncio.Task] = {}
         self.log = logging.getLogger(__name__)
 
-    async def _send(self, message: Dict) -> Any:
-        if message['type'] == 'send':
-            self.signald_message_id += 1
-            message['id'] = str(self.signald_message_id)
-
-        async with self._socket_lock:
-            await self._socket.send(message)
-
-            # Wait on response for our message.
-            if message.get('id'):
-                self.log.debug(f"Waiting for success of message id {message['id']}")
-            # Wait on responses for several types of messages.
-            elif message.get('type') == 'get_profile':
-                self.log.debug("Waiting for response of get_profile")
-            elif message.get('type') == 'get_group':
-                self.log.debug("Waiting for response of get_group")
-            elif message.get('type') == 'list_groups':
-                self.log.debug("Waiting for response of list_groups")
-            elif message.get('type') == 'update_group':
-                self.log.debug("Waiting for response of update_group")
-            elif message.get('type') == 'create_group':
-                self.log.debug("Waiting for response of create_group")
-            elif message.get('type') == 'leave_group':
-                self.log.debug("Waiting for response of leave_group")
-            elif message.get('type') == 'group_link_info':
-                self.log.debug("Waiting for response of preview_group")
-            # Skip everything else.
-            else:
-                return True
-
-            # Wait for response.
-            async for line in self._socket.read():
-                self.log.debug(f"Socket of sender received: {line.decode()}")
+        self._pool.set_connect_handler(self._start_reader)
+        self._pool.set_discard_handler(self._stop_reader)
+
+    async def __aenter__(self) -> 'MessageSender':
+        """Open the socket pool and read responses from its sockets."""
+        await self._pool.__aenter__()
+        return self
+
+    async def __aexit__(self, *excinfo: Any) -> None:
+        """Stop reading responses and close the socket pool."""
+        for reader in list(self._readers.values()):
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+        await self._pool.__aexit__(*excinfo)
+
+    async def _start_reader(self, socket: Socket) -> None:
+        """Start reading responses from a newly connected socket."""
+        self._readers[socket] = asyncio.ensure_future(self._read_responses(socket))
+
+    def _fail_pending(self, socket: Socket, exc: BaseException) -> None:
+        """Fail the requests waiting on a response from a socket."""
+        for message_id, (pending_socket, future) in list(self._pending.items()):
+            if pending_socket is socket:
+                del self._pending[message_id]
+                if not future.done():
+                    future.set_exception(exc)
+
+    def _stop_reader(self, socket: Socket) -> None:
+        """Stop reading responses from a socket that the pool closes."""
+        self._fail_pending(socket, ConnectionResetError("Connection was closed"))
+        reader = self._readers.pop(socket, None)
+        if reader is not None and reader is not asyncio.current_task():
+            reader.cancel()
+
+    async def _read_responses(self, socket: Socket) -> None:
+        """Read responses from a socket and hand them to the waiting requests."""
+        try:
+            async for line in socket.read():
+                if self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug(f"Socket of sender received: {line.decode()}")
 
                 # Load Signal message wrapper.
                 try:
-                    response_wrapper = json.loads(line)
-                except json.JSONDecodeError as e:
+                    response_wrapper = self._codec.decode(line)
+                except ValueError as e:
                     self.log.error("Could not decode signald response", exc_info=e)
                     continue
 
-                # Return get_profile response.
-                if response_wrapper.get('type') == 'get_profile':
-                    return Profile.create_from_receive_dict(
-                        response_wrapper.get('data', {})
-                    )
-
-                if response_wrapper.get('type') == 'list_groups':
-                    return [
-                        GroupV2.create_from_receive_dict(
-                            group
-                        ) for group in response_wrapper.get('data', {})['groups']
-                    ]
-
-                if response_wrapper.get('type') == 'get_group':
-                    return GroupV2.create_from_receive_dict(
-                        response_wrapper.get('data', {})
-                    )
-
-                if response_wrapper.get('type') == 'update_group':
-                    return GroupV2.create_from_receive_dict(
-                        response_wrapper.get('data', {})['v2']
-                    )
-
-                if response_wrapper.get('type') == 'create_group':
-                    return GroupV2.create_from_receive_dict(
-                        response_wrapper.get('data', {})
-                    )
-
-                if response_wrapper.get('type') == 'leave_group':
-                    return GroupV2.create_from_receive_dict(
-                        response_wrapper.get('data', {})
-                    )
-
-                if response_wrapper.get('type') == 'group_link_info':
-                    return GroupV2.create_from_receive_dict(
-                        response_wrapper.get('data', {})
-                    )
-
-                # Skip everything but response for our message.
-                if 'id' not in response_wrapper:
+                # Skip everything nobody is waiting on.
+                _, future = self._pending.pop(response_wrapper.get('id'), (None, None))
+                if future is None or future.done():
                     continue
 
-                if response_wrapper['id'] != message['id']:
-                    self.log.warning("Received message response for another id")
-                    continue
-
-                if response_wrapper.get("error") is not None:
-                    self.log.warning(f"Could not send message:"
-                                     f"{response_wrapper}")
-
-                    if not self._raise_signald_errors:
-                        return False
-
-                    # Match error.
-                    for error_class in IDENTIFIABLE_SIGNALD_ERRORS:
-                        if error_class.IDENTIFIER == response_wrapper.get("error_type"):
-                            error_dict = response_wrapper.get("error")
-                            if not error_dict:
-                                break
-
-                            error = error_class()
-                            for k in error_dict.keys():
-                                setattr(error, k, error_dict.get(k))
-
-                            raise error
+                future.set_result(response_wrapper)
+        except Exception as exc:
+            if isinstance(exc, ConnectionResetError):
+                self.log.warning("Connection of sender socket was reset")
+            else:
+                self.log.error("Reading signald responses failed", exc_info=exc)
+
+            # Fail requests waiting on this socket, the pool replaces the socket.
+            self._fail_pending(socket, exc)
+            await self._pool.discard(socket)
+        finally:
+            self._readers.pop(socket, None)
+
+    async def _request(self, message: Dict) -> Any:
+        """Send a request to signald, returns the response if it has one."""
+        self.signald_message_id += 1
+        message['id'] = str(self.signald_message_id)
+
+        async with self._pool.lease() as socket:
+            # Skip waiting on a response for everything but the response types.
+            if message['type'] not in self.RESPONSE_TYPES:
+                await socket.send(message)
+                return None
+
+            future = asyncio.get_event_loop().create_future()
+            self._pending[message['id']] = (socket, future)
+            try:
+                await socket.send(message)
+
+                self.log.debug(f"Waiting for response of {message['type']} "
+                               f"(id {message['id']})")
+                return await future
+            finally:
+                self._pending.pop(message['id'], None)
+
+    async def _deliver(self, message: Dict, priority: int) -> Any:
+        """Send a request within the rate limits, returns the response if it has one."""
+        if self._rate_limiter is None or message['type'] not in self.LIMITED_TYPES:
+            async with self._scheduler.slot(priority):
+                return await self._request(message)
+
+        recipient = message.get("recipientGroupId") or \
+            next(iter(message.get("recipientAddress", {}).values()), None)
+        for requeues in range(self._rate_limiter.max_requeues + 1):
+            # Wait on the rate limits before taking a slot, waiting sends do
+            # not hold slots needed by sends of other recipients.
+            await self._rate_limiter.acquire(recipient)
+            async with self._scheduler.slot(priority):
+                response_wrapper = await self._request(message)
+            if response_wrapper is None:
+                self._rate_limiter.succeeded()
+                return None
+
+            retry_after = get_retry_after(response_wrapper)
+            if retry_after is None:
+                self._rate_limiter.succeeded()
+                break
+
+            # Queue the message again after backing off, instead of failing it.
+            if requeues < self._rate_limiter.max_requeues:
+                self._rate_limiter.limited(recipient, retry_after)
+
+        return response_wrapper
+
+    def _is_retryable(self, response_wrapper: Dict) -> bool:
+        """Check if a failed request should be retried by the retry policy."""
+        if self._retry_policy is None:
+            return False
 
-                    raise UnknownError(response_wrapper.get("error_type"),
-                                       response_wrapper.get("error"))
+        # Rate limits were already retried by the rate limiter.
+        if self._rate_limiter is not None and \
+                response_wrapper.get('type') in self.LIMITED_TYPES and \
+                get_retry_after(response_wrapper) is not None:
+            return False
+        return self._retry_policy.is_retryable(response_wrapper)
 
-                response = response_wrapper['data']
-                results = response.get("results")
+    async def _send(self, message: Dict,
+                    priority: int = SendScheduler.INTERACTIVE) -> Any:
+        if self._retry_policy is None or \
+                message['type'] not in self._retry_policy.RETRYABLE_TYPES:
+            response_wrapper = await self._deliver(message, priority)
+        else:
+            # Recipients drop duplicate messages with the same timestamp.
+            if message['type'] == "send":
+                message.setdefault("timestamp", int(time() * 1000))
 
-                if results:
-                    if results[0].get('success'):
-                        return True
+            self._retry_policy.add_request()
+            retries = 0
+            while True:
+                try:
+                    response_wrapper = await self._deliver(message, priority)
+                    if response_wrapper is None or \
+                            not self._is_retryable(response_wrapper) or \
+                            not self._retry_policy.allow_retry(retries):
+                        break
+                except ConnectionError:
+                    if not self._retry_policy.allow_retry(retries):
+                        raise
+
+                delay = self._retry_policy.get_delay(retries)
+                retries += 1
+                self.log.info(f"Retrying {message['type']} in {delay:.2f} seconds "
+                              f"(retry {retries})")
+                await anyio.sleep(delay)
+
+        if response_wrapper is None:
+            return True
+        return self._process_response(response_wrapper)
+
+    def _cache_group(self, group: GroupV2) -> None:
+        """Put a group in the cache, unless a newer revision was seen."""
+        if group.revision is None or \
+                group.revision < self._group_revisions.get(group.id, group.revision):
+            self._forget_group(group.id)
+            return
+
+        self._groups[group.id] = group
+        self._group_revisions[group.id] = group.revision
+
+    def _forget_group(self, group_id: str) -> None:
+        """Remove a group from the cache."""
+        self._groups.pop(group_id, None)
+        self._groups_listed = False
+
+    def observe_group(self, group_id: str, revision: Optional[int]) -> None:
+        """
+        Invalidate a cached group when a message shows a newer revision.
+
+        :param group_id: Identifier of the group of a received message
+        :param revision: Revision of the group in the received message
+        """
+        if revision is None:
+            if group_id not in self._groups:
+                self._groups_listed = False
+            return
+
+        if revision > self._group_revisions.get(group_id, -1):
+            self._group_revisions[group_id] = revision
+            self._forget_group(group_id)
+
+    def _process_response(self, response_wrapper: Dict) -> Any:
+        """Process the signald response for a request."""
+        if response_wrapper.get("error") is not None:
+            self.log.warning(f"Could not send message:"
+                             f"{response_wrapper}")
+
+            if not self._raise_signald_errors:
                 return False
-            return False
+
+            # Match error.
+            for error_class in IDENTIFIABLE_SIGNALD_ERRORS:
+                if error_class.IDENTIFIER == response_wrapper.get("error_type"):
+                    error_dict = response_wrapper.get("error")
+                    if not error_dict:
+                        break
+
+                    error = error_class()
+                    for k in error_dict.keys():
+                        setattr(error, k, error_dict.get(k))
+
+                    raise error
+
+            raise UnknownError(response_wrapper.get("error_type", ""),
+                               response_wrapper.get("error"))
+
+        # Return get_profile response.
+        if response_wrapper.get('type') == 'get_profile':
+            return Profile.create_from_receive_dict(
+                response_wrapper.get('data', {})
+            )
+
+        if response_wrapper.get('type') == 'list_groups':
+            groups = [
+                GroupV2.create_from_receive_dict(
+                    group
+                ) for group in response_wrapper.get('data', {})['groups']
+            ]
+            self._groups.clear()
+            for group in groups:
+                self._cache_group(group)
+            self._groups_listed = len(self._groups) == len(groups)
+            return groups
+
+        if response_wrapper.get('type') == 'group_link_info':
+            return GroupV2.create_from_receive_dict(
+                response_wrapper.get('data', {})
+            )
+
+        if response_wrapper.get('type') == 'leave_group':
+            group = GroupV2.create_from_receive_dict(response_wrapper.get('data', {}))
+            self._forget_group(group.id)
+            return group
+
+        if response_wrapper.get('type') in ('get_group', 'create_group'):
+            group = GroupV2.create_from_receive_dict(response_wrapper.get('data', {}))
+            self._cache_group(group)
+            return group
+
+        if response_wrapper.get('type') == 'update_group':
+            group = GroupV2.create_from_receive_dict(
+                response_wrapper.get('data', {})['v2']
+            )
+            self._cache_group(group)
+            return group
+
+        response = response_wrapper['data']
+        results = response.get("results")
+
+        if results:
+            if results[0].get('success'):
+                return True
+        return False
 
     async def send_message(self, receiver: str, body: str,
                            attachments: Optional[List[Attachment]] = None,
-                           link_previews: Optional[List[LinkPreview]] = None) -> bool:
+                           link_previews: Optional[List[LinkPreview]] = None,
+                           priority: int = SendScheduler.INTERACTIVE) -> bool:
         """
         Send a message.
 
@@ -177,6 +374,7 @@ class MessageSender:
         :param body:          The body of the message.
         :param attachments:   Optional attachments to the message.
         :param link_previews: Optional link previews for the message.
+        :param priority:      Priority class of the message.
 
         :return: Returns whether sending is successful.
         :rtype: bool
@@ -206,14 +404,16 @@ class MessageSender:
                 link_preview.to_send_dict() for link_preview in link_previews
             ]
 
-        return await self._send(bot_message)
+        return await self._send(bot_message, priority)
 
-    async def reply_message(self, message: Message, reply: Reply) -> bool:
+    async def reply_message(self, message: Message, reply: Reply,
+                            priority: int = SendScheduler.INTERACTIVE) -> bool:
         """
         Send the bot message.
 
-        :param message: The original message replying to.
-        :param reply:   The reply to send.
+        :param message:  The original message replying to.
+        :param reply:    The reply to send.
+        :param priority: Priority class of the reply.
 
         :return: Returns whether replying is successful.
         :rtype: bool
@@ -267,7 +467,7 @@ class MessageSender:
         else:
             bot_message["recipientAddress"] = {"uuid": message.source.uuid}
 
-        return await self._send(bot_message)
+        return await self._send(bot_message, priority)
 
     async def typing_started(self, message: Message) -> None:
         """
@@ -352,20 +552,53 @@ class MessageSender:
 
         await self._send(profile_message)
 
+    async def _fetch_profile(self, uuid: str) -> Profile:
+        """Get a Signal profile from signald and put it in the cache."""
+        profile = await self._send({
+            "type": "get_profile",
+            "version": "v1",
+            "account": self._username,
+            "address": {"uuid": uuid}
+        })
+
+        if isinstance(profile, Profile) and self._profile_cache_size > 0:
+            self._profiles[uuid] = (monotonic() + self._profile_cache_ttl, profile)
+            self._profiles.move_to_end(uuid)
+            if len(self._profiles) > self._profile_cache_size:
+                self._profiles.popitem(last=False)
+        return profile
+
     async def get_profile(self, message: Message) -> Profile:
         """
         Get Signal profile of message sender.
 
+        Profiles are cached for profile_cache_ttl seconds and concurrent
+        requests for the same profile share a single signald request.
+
         :param message: The Signal message you received.
 
         :returns: Signal profile
         """
-        return await self._send({
-            "type": "get_profile",
-            "version": "v1",
-            "account": self._username,
-            "address": {"uuid": message.source.uuid}
-        })
+        uuid = message.source.uuid
+        cached = self._profiles.get(uuid)
+        if cached is not None:
+            if cached[0] > monotonic():
+                self.profile_cache_hits += 1
+                self._profiles.move_to_end(uuid)
+                return cached[1]
+            del self._profiles[uuid]
+
+        request = self._profile_requests.get(uuid)
+        if request is None:
+            self.profile_cache_misses += 1
+            request = asyncio.ensure_future(self._fetch_profile(uuid))
+            self._profile_requests[uuid] = request
+            request.add_done_callback(lambda _: self._profile_requests.pop(uuid, None))
+        else:
+            self.profile_cache_hits += 1
+
+        # Shield the request from cancellation, other callers may wait on it.
+        return await asyncio.shield(request)
 
     async def set_expiration(self, receiver: str, time: int) -> None:
         """
@@ -394,6 +627,7 @@ class MessageSender:
 
         :param group_id: Group id to accept invitation from
         """
+        self._forget_group(group_id)
         await self._send({
             "type": "accept_invitation",
             "version": "v1",
@@ -403,10 +637,15 @@ class MessageSender:
 
     async def list_groups(self) -> List[GroupV2]:
         """
-        List groups for an account.
+        List groups for an account, from the cache if it holds all groups.
 
         :return: Returns a list of v2 group objects
         """
+        if self._groups_listed:
+            self.group_cache_hits += 1
+            return list(self._groups.values())
+
+        self.group_cache_misses += 1
         return await self._send({
             "type": "list_groups",
             "version": "v1",
@@ -415,12 +654,18 @@ class MessageSender:
 
     async def get_group(self, group_id: str) -> GroupV2:
         """
-        Get details of a group.
+        Get details of a group, from the cache if its revision is current.
 
         :param group_id: Group id to get details for
 
         :return: Returns a GroupV2 object
         """
+        group = self._groups.get(group_id)
+        if group is not None:
+            self.group_cache_hits += 1
+            return group
+
+        self.group_cache_misses += 1
         return await self._send({
             "type": "get_group",
             "version": "v1",
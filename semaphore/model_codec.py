@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an object that converts models from and to signald data."""
+import logging
+import re
+from typing import Any, Callable, Dict, FrozenSet, Generic, Optional, Set, Type, TypeVar
+
+import attr
+
+T = TypeVar('T')
+
+
+def snake_to_camel(name: str) -> str:
+    """Convert a snake case attribute name to the camel case name used by signald."""
+    name = re.sub(r"(_|-)+", " ", name).title().replace(" ", "")
+    return ''.join([name[0].lower(), name[1:]])
+
+
+class ModelCodec(Generic[T]):
+    """This object converts an attrs model from and to signald data.
+
+    The map from data names to attribute names is built once, when the codec
+    is created. Decoders convert nested data of an attribute. Data names
+    that are not mapped are ignored, with a warning the first time a name
+    is seen.
+    """
+
+    def __init__(self,
+                 cls: Type[T],
+                 camel_case: bool = True,
+                 decoders: Optional[Dict[str, Callable[[Any], Any]]] = None) -> None:
+        """Initialize model codec."""
+        self._cls: Type[T] = cls
+        self._names: Dict[str, str] = {
+            field.name: snake_to_camel(field.name) if camel_case else field.name
+            for field in attr.fields(cls)  # type: ignore[arg-type]
+        }
+        self._known: FrozenSet[str] = frozenset(self._names.values())
+        self._decoders: Dict[str, Callable[[Any], Any]] = decoders or {}
+        self._ignored: Set[str] = set()
+        self.log = logging.getLogger(cls.__module__)
+
+    def decode(self, data: Dict[str, Any]) -> T:
+        """Create a model from signald data, attributes missing in the data are None."""
+        values = {name: data.get(data_name) for name, data_name in self._names.items()}
+        for name, decoder in self._decoders.items():
+            if values[name]:
+                values[name] = decoder(values[name])
+
+        if not self._known.issuperset(data):
+            for data_name in data.keys() - self._known - self._ignored:
+                self._ignored.add(data_name)
+                self.log.warning(f"Attribute {data_name} in data of "
+                                 f"{self._cls.__name__} is ignored")
+        return self._cls(**values)
+
+    def encode(self, obj: T, exclude: FrozenSet[str] = frozenset()) -> Dict[str, Any]:
+        """Create signald data from a model, leaving out attributes that are None."""
+        data = {}
+        for name, data_name in self._names.items():
+            value = getattr(obj, name)
+            if value is not None and name not in exclude:
+                data[data_name] = value
+        return data
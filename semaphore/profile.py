@@ -16,15 +16,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """This module contains an object that represents a Signal profile."""
-import logging
 from typing import Dict, List
 
 import attr
 
 from .address import Address
+from .model_codec import ModelCodec
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Profile:
     """This object represents a Signal profile.
 
@@ -47,23 +47,8 @@ class Profile:
 
     @staticmethod
     def create_from_receive_dict(data: dict) -> 'Profile':
-        log = logging.getLogger(__name__)
+        return _CODEC.decode(data)
 
-        profile = Profile("")
-        profile_attr_names = attr.asdict(profile)
 
-        processed_data_attrs = set()
-        for attr_name in profile_attr_names:
-            if attr_name == 'address' and data.get('address'):
-                address = Address.create_from_receive_dict(data['address'])
-                setattr(profile, attr_name, address)
-            else:
-                setattr(profile, attr_name, data.get(attr_name))
-
-            processed_data_attrs.add(attr_name)
-
-        for attr_name in data:
-            if attr_name not in processed_data_attrs:
-                log.warning(f"Attribute {attr_name} in data was ignored")
-
-        return profile
+_CODEC = ModelCodec(Profile, camel_case=False,
+                    decoders={"address": Address.create_from_receive_dict})
@@ -18,16 +18,40 @@ class PriorityQueue:
 
     def __init__(self) -> None:
         """Initialize PriorityQueue."""
-        self._not_empty = anyio.create_event()
+        self._head_changed = anyio.Event()
         self._queue: List = []
         self._counter = 0
 
+    def __len__(self) -> int:
+        """Return the number of items in the queue."""
+        return len(self._queue)
+
     async def put_nowait(self, prio: float, item: Job) -> None:
         """Put an item into the queue without blocking."""
-        heappush(self._queue, (prio, self._counter, item))
+        entry = (prio, self._counter, item)
+        heappush(self._queue, entry)
         self._counter += 1
-        if not self._not_empty.is_set():
-            await self._not_empty.set()
+
+        # Wake up waiters when the item is the new head of the queue.
+        if self._queue[0] is entry:
+            self._head_changed.set()
+            self._head_changed = anyio.Event()
+
+    def remove(self, item: Job) -> None:
+        """Remove an item from the queue, a no-op as heap entries are dropped lazily."""
+
+    def peek(self) -> Tuple[float, Job]:
+        """Return the item with the lowest priority without removing it.
+
+        :raises WouldBlock: If the queue is empty
+
+        :returns: Item from the queue
+        """
+        if not self._queue:
+            raise WouldBlock
+
+        prio, _, item = self._queue[0]
+        return prio, item
 
     def get_nowait(self) -> Tuple[float, Job]:
         """Remove and return an item if one is immediately available.
@@ -36,12 +60,12 @@ class PriorityQueue:
 
         :returns: Item from the queue
         """
-        if not self._not_empty.is_set():
+        if not self._queue:
             raise WouldBlock
 
         prio, _, item = heappop(self._queue)
-
-        if not self._queue:
-            self._not_empty = anyio.create_event()
-
         return prio, item
+
+    async def wait_head_changed(self) -> None:
+        """Wait until an item is put at the head of the queue."""
+        await self._head_changed.wait()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that limit the rate of sent messages."""
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Optional
+
+import anyio
+
+# Signald error types of rate limited sends.
+RATE_LIMIT_ERRORS = {"RateLimitError", "ProofRequiredError"}
+
+
+def get_retry_after(response: Dict[str, Any]) -> Optional[float]:
+    """Get the seconds to wait after a rate limited send.
+
+    :param response: Response of signald to a send
+
+    :returns: Seconds to wait, 0 if unknown or None if the send was not limited
+    """
+    if response.get("error_type") in RATE_LIMIT_ERRORS:
+        error = response.get("error") or {}
+        return float(error.get("retry_after") or 0)
+
+    results = (response.get("data") or {}).get("results") or []
+    for result in results:
+        failure = result.get("proof_required_failure") or result.get("rateLimitFailure")
+        if failure:
+            return float(failure.get("retry_after") or 0)
+    return None
+
+
+class TokenBucket:
+    """This object represents a token bucket.
+
+    The bucket holds up to burst tokens and refills rate tokens per second.
+    Tokens are reserved ahead, a reservation on an empty bucket gets the
+    delay until its token is refilled.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize token bucket."""
+        self.rate: float = rate
+        self.burst: float = burst
+        self._tokens: float = burst
+        self._updated: float = monotonic()
+
+    def _refill(self) -> None:
+        """Refill the tokens since the last update."""
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Reserve a token, returns the seconds to wait before using it."""
+        self._refill()
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Make the next token available after seconds at the earliest."""
+        self._refill()
+        self._tokens = min(self._tokens, 1.0) - seconds * self.rate
+
+
+class RateLimiter:
+    """This object represents a rate limiter for sending messages.
+
+    Sends take a token of the account bucket and of the bucket of their
+    recipient, waiting until both have a token. Buckets of the least
+    recently used recipients are dropped beyond max_recipients.
+
+    When signald reports a rate limit, the account rate is halved down to
+    min_rate and sending pauses with an exponential backoff, or as long as
+    signald asks. Every successful send restores recovery of the configured
+    rate. Rate limited sends are queued again, at most max_requeues times.
+    """
+
+    def __init__(self,
+                 rate: float = 10.0,
+                 burst: float = 20.0,
+                 recipient_rate: float = 1.0,
+                 recipient_burst: float = 5.0,
+                 max_recipients: int = 10000,
+                 min_rate: float = 0.5,
+                 recovery: float = 0.05,
+                 backoff: float = 1.0,
+                 max_backoff: float = 300.0,
+                 max_requeues: int = 5) -> None:
+        """Initialize rate limiter."""
+        self._rate: float = rate
+        self._recipient_rate: float = recipient_rate
+        self._recipient_burst: float = recipient_burst
+        self._max_recipients: int = max_recipients
+        self._min_rate: float = min_rate
+        self._recovery: float = recovery
+        self._backoff: float = backoff
+        self._max_backoff: float = max_backoff
+        self.max_requeues: int = max_requeues
+
+        self._account = TokenBucket(rate, burst)
+        self._recipients: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._rate_limits: int = 0
+
+        # Number of sends that had to wait on a bucket.
+        self.delayed: int = 0
+        # Number of sends that signald reported as rate limited.
+        self.rate_limited: int = 0
+
+        self.log = logging.getLogger(__name__)
+
+    def get_rate(self) -> float:
+        """Get the current account rate in messages per second."""
+        return self._account.rate
+
+    def _get_bucket(self, recipient: str) -> TokenBucket:
+        """Get the bucket of a recipient, creating it if needed."""
+        bucket = self._recipients.get(recipient)
+        if bucket is None:
+            bucket = TokenBucket(self._recipient_rate, self._recipient_burst)
+            if len(self._recipients) >= self._max_recipients:
+                self._recipients.popitem(last=False)
+        self._recipients[recipient] = bucket
+        self._recipients.move_to_end(recipient)
+        return bucket
+
+    async def acquire(self, recipient: Optional[str] = None) -> None:
+        """Wait until a message may be sent to the recipient."""
+        delay = self._get_bucket(recipient).reserve() if recipient is not None else 0.0
+        if delay > 0:
+            self.delayed += 1
+            await anyio.sleep(delay)
+
+        # Reserve the account token after the recipient wait, to not waste it.
+        delay = self._account.reserve()
+        if delay > 0:
+            self.delayed += 1
+            await anyio.sleep(delay)
+
+    def limited(self, recipient: Optional[str] = None, retry_after: float = 0.0) -> None:
+        """Back off after signald reported a rate limited send."""
+        self.rate_limited += 1
+        self._rate_limits += 1
+        self._account.rate = max(self._min_rate, self._account.rate / 2)
+
+        delay = min(self._max_backoff, self._backoff * 2 ** (self._rate_limits - 1))
+        delay = max(delay, retry_after)
+        self._account.pause(delay)
+        if recipient is not None:
+            self._get_bucket(recipient).pause(delay)
+        self.log.warning(f"Rate limited, pausing sends for {delay:.1f} seconds "
+                         f"at {self._account.rate:.2f} messages per second")
+
+    def succeeded(self) -> None:
+        """Recover the rate after a successful send."""
+        self._rate_limits = 0
+        if self._account.rate < self._rate:
+            self._account.rate = min(self._rate,
+                                     self._account.rate + self._rate * self._recovery)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an object that retries failed signald requests."""
+from __future__ import annotations
+
+import logging
+import random
+from typing import Any, Dict
+
+from .exceptions import InternalError, RateLimitError, SeverNotFoundError
+
+
+class RetryPolicy:
+    """This object represents a policy for retrying failed signald requests.
+
+    Requests failing with a transient signald error or connection error are
+    retried at most max_retries times, after a backoff doubling from
+    base_delay up to max_delay with full jitter. Other errors are fatal.
+    Only idempotent request types are retried, a request that failed after
+    signald applied it must not create a group or change it twice.
+
+    Retries are paid from a budget that every request adds budget_ratio to,
+    up to budget_max. When the budget is spent, failures are not retried, so
+    retries add at most budget_ratio extra requests during an outage.
+    """
+
+    # Request types that can be sent again, sends keep their timestamp.
+    RETRYABLE_TYPES = {"send", "get_profile", "get_group", "list_groups"}
+
+    # Signald error types of transient failures.
+    RETRYABLE_ERRORS = {InternalError.IDENTIFIER, SeverNotFoundError.IDENTIFIER,
+                        RateLimitError.IDENTIFIER}
+
+    def __init__(self,
+                 max_retries: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0,
+                 budget_ratio: float = 0.1,
+                 budget_max: float = 10.0) -> None:
+        """Initialize retry policy."""
+        self._max_retries: int = max_retries
+        self._base_delay: float = base_delay
+        self._max_delay: float = max_delay
+        self._budget_ratio: float = budget_ratio
+        self._budget_max: float = budget_max
+        self._budget: float = budget_max
+
+        # Number of retried requests and of failures the budget did not allow.
+        self.retries: int = 0
+        self.denied: int = 0
+
+        self.log = logging.getLogger(__name__)
+
+    def is_retryable(self, response: Dict[str, Any]) -> bool:
+        """Check if a signald response is a transient failure.
+
+        :param response: Response of signald to a request
+
+        :returns: True if the request may succeed when sent again
+        """
+        if response.get("error") is not None:
+            return response.get("error_type") in self.RETRYABLE_ERRORS
+
+        # Sends report network failures per recipient.
+        results = (response.get("data") or {}).get("results") or []
+        return any(result.get("networkFailure") for result in results)
+
+    def add_request(self) -> None:
+        """Add a new request to the retry budget."""
+        self._budget = min(self._budget_max, self._budget + self._budget_ratio)
+
+    def allow_retry(self, retries: int) -> bool:
+        """Spend the retry budget on a retry, if allowed.
+
+        :param retries: Number of times the request was already retried
+
+        :returns: True if the request may be retried
+        """
+        if retries >= self._max_retries:
+            return False
+
+        if self._budget < 1:
+            self.denied += 1
+            self.log.warning("Retry budget spent, not retrying failed request")
+            return False
+
+        self._budget -= 1
+        self.retries += 1
+        return True
+
+    def get_delay(self, retries: int) -> float:
+        """Get the jittered backoff in seconds before a retry.
+
+        :param retries: Number of times the request was already retried
+
+        :returns: Seconds to wait before sending the request again
+        """
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** retries))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an object that routes messages to handlers."""
+import logging
+import re
+from typing import Callable, Dict, Iterator, List, Match, Optional, Pattern, Tuple
+
+# Characters with a special meaning in a regular expression.
+_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+# Backreferences, conditional references and global inline flags can not be
+# part of a combined pattern.
+_UNCOMBINABLE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+# Group names are dropped from a combined pattern, they may clash.
+_NAMED_GROUP = re.compile(r"(?<!\\)\(\?P<\w+>")
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Get the literal text a pattern starts with."""
+    prefix: List[str] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum() or escaped == "_":
+                break
+            prefix.append(escaped)
+            i += 2
+        elif char in _SPECIAL_CHARACTERS:
+            break
+        else:
+            prefix.append(char)
+            i += 1
+
+    # A quantifier makes the last character optional or repeated.
+    if prefix and i < len(pattern) and pattern[i] in "*?{":
+        prefix.pop()
+    return "".join(prefix)
+
+
+class Router:
+    """This object represents a router that matches messages against handlers.
+
+    Handlers are matched in registration order. Instead of searching every
+    handler regex for every message, the router compiles the handlers into:
+
+    - an index of the literal prefixes of anchored regexes (``^!help``)
+    - a required literal check for unanchored regexes (``!btc (.*)``)
+    - one combined alternation that filters the remaining regexes
+    """
+
+    def __init__(self) -> None:
+        """Initialize router."""
+        self._handlers: List[Tuple[Pattern, Callable]] = []
+        self._compiled: bool = False
+        self._prefix_lengths: List[int] = []
+        self._prefixes: Dict[int, Dict[str, List[int]]] = {}
+        self._literals: List[Tuple[str, int]] = []
+        self._combined: Optional[Pattern] = None
+        self._combined_handlers: List[int] = []
+        self._unfiltered: List[int] = []
+
+        self.log = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        """Get the number of handlers."""
+        return len(self._handlers)
+
+    def add(self, regex: Pattern, func: Callable) -> None:
+        """Add a handler to the router."""
+        self._handlers.append((regex, func))
+        self._compiled = False
+
+    def _compile(self) -> None:
+        """Compile the handlers into the prefix index and combined pattern."""
+        self._prefixes = {}
+        self._literals = []
+        self._combined_handlers = []
+        self._unfiltered = []
+
+        for index, (regex, _) in enumerate(self._handlers):
+            pattern = regex.pattern
+            plain = isinstance(pattern, str)
+            plain = plain and not regex.flags & (re.IGNORECASE | re.VERBOSE)
+
+            if plain and "|" not in pattern:
+                if pattern.startswith("^") and not regex.flags & re.MULTILINE:
+                    prefix = _literal_prefix(pattern[1:])
+                    if prefix:
+                        prefixes = self._prefixes.setdefault(len(prefix), {})
+                        prefixes.setdefault(prefix, []).append(index)
+                        continue
+                else:
+                    literal = _literal_prefix(pattern)
+                    if literal:
+                        self._literals.append((literal, index))
+                        continue
+
+            combinable = plain and regex.flags == re.UNICODE
+            if combinable and not _UNCOMBINABLE.search(pattern):
+                self._combined_handlers.append(index)
+            else:
+                self._unfiltered.append(index)
+
+        self._prefix_lengths = sorted(self._prefixes)
+
+        self._combined = None
+        if self._combined_handlers:
+            try:
+                patterns = [_NAMED_GROUP.sub("(?:", self._handlers[index][0].pattern)
+                            for index in self._combined_handlers]
+                self._combined = re.compile("|".join(f"(?:{p})" for p in patterns))
+            except re.error:
+                self._unfiltered.extend(self._combined_handlers)
+                self._unfiltered.sort()
+                self._combined_handlers = []
+
+        self._compiled = True
+        self.log.debug(f"Router compiled {len(self._handlers)} handlers "
+                       f"({len(self._combined_handlers)} combined, "
+                       f"{len(self._unfiltered)} unfiltered)")
+
+    def _candidates(self, body: str) -> List[int]:
+        """Get the handlers that can match a message body, in registration order."""
+        candidates: List[int] = list(self._unfiltered)
+
+        for length in self._prefix_lengths:
+            if length > len(body):
+                break
+            indexes = self._prefixes[length].get(body[:length])
+            if indexes:
+                candidates.extend(indexes)
+
+        candidates.extend(index for literal, index in self._literals
+                          if literal in body)
+
+        if self._combined is not None and self._combined.search(body):
+            candidates.extend(self._combined_handlers)
+
+        candidates.sort()
+        return candidates
+
+    def match(self, body: str) -> Iterator[Tuple[Pattern, Callable, Match]]:
+        """Get the matching handlers for a message body, in registration order."""
+        if not self._compiled:
+            self._compile()
+
+        for index in self._candidates(body):
+            regex, func = self._handlers[index]
+            match = regex.search(body)
+            if match:
+                yield regex, func, match
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains objects that compute the runs of repeating jobs."""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Type, Union
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, rruleset, rrulestr, YEARLY
+from dateutil.tz import gettz, resolve_imaginary
+
+_CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+_CRON_NAMES = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+    "sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6,
+}
+# Maximum number of days of every month, including leap days.
+_MONTH_DAYS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _get_timezone(timezone: Optional[str]) -> Optional[tzinfo]:
+    """Get a time zone by name, None for local time."""
+    if timezone is None:
+        return None
+    zone = gettz(timezone)
+    if zone is None:
+        raise ValueError(f"Unknown time zone: {timezone}")
+    return zone
+
+
+def _parse_cron_value(text: str) -> int:
+    """Parse a number or a month or weekday name of a cron field."""
+    return _CRON_NAMES[text] if text in _CRON_NAMES else int(text)
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    """Parse a field of a cron expression into the values it matches."""
+    values: Set[int] = set()
+    for part in field.lower().split(","):
+        part, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if part == "*":
+            start, end = low, high
+        else:
+            first, _, last = part.partition("-")
+            start = _parse_cron_value(first)
+            if last:
+                end = _parse_cron_value(last)
+            else:
+                # A single value with a step, like 5/15, runs until the end.
+                end = high if step_text else start
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Schedule(ABC):
+    """This object represents the schedule of a repeating job.
+
+    Subclass this object for other schedules. Runs are computed from the
+    previous scheduled run instead of the time a job ran, so jobs do not
+    drift when they run late.
+    """
+
+    # Schedule classes by type, to create schedules from their dicts.
+    TYPES: Dict[str, Type[Schedule]] = {}
+    TYPE: str = ""
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Register a schedule class by its type."""
+        super().__init_subclass__(**kwargs)
+        if cls.TYPE:
+            Schedule.TYPES[cls.TYPE] = cls
+
+    @abstractmethod
+    def next_after(self, timestamp: float) -> Optional[float]:
+        """Get the first run after a timestamp, None if there are no more runs."""
+
+    @abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable dict of the schedule."""
+
+    @staticmethod
+    def create_from_dict(data: Dict[str, Any]) -> Schedule:
+        """Create a schedule from its dict."""
+        arguments = dict(data)
+        schedule_class = Schedule.TYPES[arguments.pop("type")]
+        if schedule_class is CronSchedule:
+            return CronSchedule.get(**arguments)
+        return schedule_class(**arguments)
+
+
+class IntervalSchedule(Schedule):
+    """This object represents a schedule of runs every interval seconds.
+
+    Runs are on a grid of intervals from start, if there is no start
+    the interval is counted from the timestamp of the previous run.
+    """
+
+    TYPE = "interval"
+
+    def __init__(self, interval: float, start: Optional[float] = None) -> None:
+        """Initialize interval schedule."""
+        if interval <= 0:
+            raise ValueError("Interval should be positive")
+        self.interval: float = interval
+        self.start: Optional[float] = start
+
+    def next_after(self, timestamp: float) -> Optional[float]:
+        """Get the first run after a timestamp."""
+        if self.start is None:
+            return timestamp + self.interval
+        if timestamp < self.start:
+            return self.start
+        intervals = (timestamp - self.start) // self.interval + 1
+        return self.start + intervals * self.interval
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable dict of the schedule."""
+        return {"type": self.TYPE, "interval": self.interval, "start": self.start}
+
+
+class MonthlySchedule(Schedule):
+    """This object represents a schedule of runs every number of months.
+
+    Runs are counted in months from start, so a job starting on the 31st
+    runs on the last day of shorter months and on the 31st again after.
+    Without start the months are counted from the previous run.
+    """
+
+    TYPE = "monthly"
+
+    def __init__(self,
+                 start: Optional[float] = None,
+                 months: int = 1,
+                 timezone: Optional[str] = None) -> None:
+        """Initialize monthly schedule."""
+        if months < 1:
+            raise ValueError("Months should be positive")
+        self.start: Optional[float] = start
+        self.months: int = months
+        self.timezone: Optional[str] = timezone
+        self._tz: Optional[tzinfo] = _get_timezone(timezone)
+
+    def next_after(self, timestamp: float) -> Optional[float]:
+        """Get the first run after a timestamp."""
+        date = datetime.fromtimestamp(timestamp, self._tz)
+        if self.start is None:
+            return (date + relativedelta(months=+self.months)).timestamp()
+
+        anchor = datetime.fromtimestamp(self.start, self._tz)
+        elapsed = (date.year - anchor.year) * 12 + date.month - anchor.month
+        count = max(elapsed // self.months, 0)
+        while True:
+            run = (anchor + relativedelta(months=+count * self.months)).timestamp()
+            if run > timestamp:
+                return run
+            count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable dict of the schedule."""
+        return {"type": self.TYPE, "start": self.start, "months": self.months,
+                "timezone": self.timezone}
+
+
+class _RuleSchedule(Schedule):
+    """Schedule of the occurrences of a calendar rule.
+
+    The runs are expanded in batches and kept sorted, so jobs sharing the
+    schedule look up their next run with a binary search.
+    """
+
+    # Number of runs to expand at once.
+    BATCH_SIZE: int = 64
+
+    def __init__(self, timezone: Optional[str] = None) -> None:
+        self.timezone: Optional[str] = timezone
+        self._tz: Optional[tzinfo] = _get_timezone(timezone)
+        self._runs: List[float] = []
+        self._expanded_from: float = float("inf")
+        self._exhausted: bool = False
+
+    @abstractmethod
+    def _create_rule(self, start: datetime) -> Union[rrule, rruleset]:
+        """Create the rule with occurrences from a start date."""
+
+    def _expand(self, timestamp: float) -> None:
+        """Expand the runs after a timestamp."""
+        start = datetime.fromtimestamp(timestamp, self._tz)
+        rule = self._create_rule(start)
+        occurrences = list(rule.xafter(start, self.BATCH_SIZE))
+        if self._tz is not None:
+            # Move runs in the gap of a daylight saving time change past the gap.
+            occurrences = [resolve_imaginary(run) for run in occurrences]
+        runs = sorted(run.timestamp() for run in occurrences)
+        self._runs = runs
+        self._expanded_from = timestamp
+        self._exhausted = len(runs) < self.BATCH_SIZE
+
+    def next_after(self, timestamp: float) -> Optional[float]:
+        """Get the first run after a timestamp, None if there are no more runs."""
+        index = bisect_right(self._runs, timestamp)
+        if timestamp < self._expanded_from or index == len(self._runs):
+            if self._exhausted and timestamp >= self._expanded_from:
+                return None
+            self._expand(timestamp)
+            index = bisect_right(self._runs, timestamp)
+            if index == len(self._runs):
+                return None
+        return self._runs[index]
+
+
+class CronSchedule(_RuleSchedule):
+    """This object represents a schedule of a cron expression.
+
+    The expression has the five fields minute, hour, day of month, month
+    and day of week, or is one of the macros like @daily. Like cron, a run
+    matches either day field when both are restricted. Times are in the
+    given time zone, or in local time.
+    """
+
+    TYPE = "cron"
+
+    def __init__(self, expression: str, timezone: Optional[str] = None) -> None:
+        """Initialize cron schedule."""
+        super().__init__(timezone)
+        self.expression: str = expression
+
+        fields = _CRON_MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expression}")
+        minute, hour, day, month, weekday = fields
+        self._minutes = sorted(_parse_cron_field(minute, 0, 59))
+        self._hours = sorted(_parse_cron_field(hour, 0, 23))
+        self._months = sorted(_parse_cron_field(month, 1, 12))
+        self._days = sorted(_parse_cron_field(day, 1, 31))
+        # Cron counts weekdays from sunday (0 and 7), dateutil from monday.
+        self._weekdays = sorted({(value - 1) % 7
+                                 for value in _parse_cron_field(weekday, 0, 7)})
+        # Like cron, runs match either day field only when both are restricted.
+        self._either_day: bool = not day.startswith("*") and not weekday.startswith("*")
+
+        # Finding the next run of days that never occur scans up to year 9999.
+        if not any(day <= _MONTH_DAYS[month - 1]
+                   for day in self._days for month in self._months):
+            if not self._either_day:
+                raise ValueError(f"Cron expression never runs: {expression}")
+            # Only the day of week field can match.
+            self._days = list(range(1, 32))
+            self._either_day = False
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get(expression: str, timezone: Optional[str] = None) -> CronSchedule:
+        """Get a cron schedule shared by all jobs with the same expression."""
+        return CronSchedule(expression, timezone)
+
+    def _create_rule(self, start: datetime) -> Union[rrule, rruleset]:
+        """Create the rule with occurrences from a start date."""
+        start = start.replace(second=0, microsecond=0)
+        if self._either_day:
+            rules = rruleset()
+            rules.rrule(self._create_day_rule(start, bymonthday=self._days))
+            rules.rrule(self._create_day_rule(start, byweekday=self._weekdays))
+            return rules
+        # Otherwise runs match both day fields, an unrestricted field matches all days.
+        return self._create_day_rule(start, bymonthday=self._days,
+                                     byweekday=self._weekdays)
+
+    def _create_day_rule(self, start: datetime, **days: Any) -> rrule:
+        """Create the rule for the times of the expression on matching days."""
+        return rrule(YEARLY, dtstart=start, bymonth=self._months, byhour=self._hours,
+                     byminute=self._minutes, bysecond=0, **days)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable dict of the schedule."""
+        return {"type": self.TYPE, "expression": self.expression,
+                "timezone": self.timezone}
+
+
+class RRuleSchedule(_RuleSchedule):
+    """This object represents a schedule of an iCalendar recurrence rule.
+
+    The rule, like "FREQ=WEEKLY;BYDAY=MO,WE;BYHOUR=9", starts at start in
+    the given time zone, or in local time. Rules with a count or an end
+    date stop the job after their last occurrence.
+    """
+
+    TYPE = "rrule"
+
+    def __init__(self,
+                 rule: str,
+                 start: float,
+                 timezone: Optional[str] = None) -> None:
+        """Initialize recurrence rule schedule."""
+        super().__init__(timezone)
+        self.rule: str = rule
+        self.start: float = start
+        # Occurrences depend on the start, so the rule caches them from there.
+        self._rule = rrulestr(rule, dtstart=datetime.fromtimestamp(start, self._tz),
+                              cache=True)
+
+    def _create_rule(self, start: datetime) -> Union[rrule, rruleset]:
+        """Get the rule, its occurrences do not depend on the start date."""
+        return self._rule
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a JSON serializable dict of the schedule."""
+        return {"type": self.TYPE, "rule": self.rule, "start": self.start,
+                "timezone": self.timezone}
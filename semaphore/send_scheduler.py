@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an object that schedules outbound signald requests."""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List, Sequence
+
+import anyio
+
+
+class SendScheduler:
+    """This object represents a scheduler of outbound signald requests.
+
+    At most max_in_flight requests are sent at the same time, other requests
+    wait in a queue of their priority class. Free slots are handed to the
+    classes by smooth weighted round robin, so every class gets a share of
+    the slots by its weight and bulk traffic can not starve replies.
+    """
+
+    # Priority classes of requests.
+    INTERACTIVE: int = 0
+    SCHEDULED: int = 1
+    BULK: int = 2
+
+    def __init__(self,
+                 max_in_flight: int = 8,
+                 weights: Sequence[int] = (8, 4, 1)) -> None:
+        """Initialize send scheduler."""
+        self._max_in_flight: int = max_in_flight
+        self._weights: Sequence[int] = weights
+        self._credits: List[int] = [0] * len(weights)
+        self._waiting: List[Deque[anyio.Event]] = [deque() for _ in weights]
+        self._in_flight: int = 0
+
+    def get_in_flight(self) -> int:
+        """Get the number of requests being sent."""
+        return self._in_flight
+
+    def get_waiting(self, priority: int) -> int:
+        """Get the number of requests waiting in a priority class."""
+        return len(self._waiting[priority])
+
+    def _next_class(self) -> int:
+        """Pick the waiting class that gets the next slot."""
+        total = 0
+        best = -1
+        for priority, waiting in enumerate(self._waiting):
+            if not waiting:
+                continue
+            self._credits[priority] += self._weights[priority]
+            total += self._weights[priority]
+            if best < 0 or self._credits[priority] > self._credits[best]:
+                best = priority
+        self._credits[best] -= total
+        return best
+
+    def _release(self) -> None:
+        """Hand the slot of a finished request to the next waiting request."""
+        if any(self._waiting):
+            self._waiting[self._next_class()].popleft().set()
+        else:
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE) -> AsyncIterator[None]:
+        """Wait for a slot to send a request of a priority class."""
+        if self._in_flight < self._max_in_flight and not any(self._waiting):
+            self._in_flight += 1
+        else:
+            event = anyio.Event()
+            self._waiting[priority].append(event)
+            try:
+                await event.wait()
+            except BaseException:
+                # Pass on a slot that was handed over while being cancelled.
+                if event.is_set():
+                    self._release()
+                else:
+                    self._waiting[priority].remove(event)
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
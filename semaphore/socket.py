@@ -16,26 +16,41 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """This module contains an object that represents a signald socket."""
-import json
 import logging
-from typing import Any, AsyncIterable, List, Optional
+from typing import Any, AsyncIterable, Optional
 
 import anyio
 import anyio.abc
 
+from .json_codec import JsonCodec
+
 
 class Socket:
     """This object represents a signald socket."""
 
+    # Number of bytes requested from the socket per receive call.
+    CHUNK_SIZE: int = 64 * 1024
+    # Default maximum size of a single line (signald JSON message).
+    MAX_LINE_SIZE: int = 16 * 1024 * 1024
+
     def __init__(self,
                  username: str,
                  socket_path: Optional[str] = None,
-                 subscribe: bool = False):
+                 subscribe: bool = False,
+                 max_line_size: int = MAX_LINE_SIZE,
+                 codec: Optional[JsonCodec] = None):
         """Initialize socket."""
         self._username: str = username
         self._socket_path: Optional[str] = socket_path
         self._socket: anyio.abc.SocketStream
         self._subscribe: bool = subscribe
+        self._max_line_size: int = max_line_size
+        self._codec: JsonCodec = codec or JsonCodec()
+        self._buffer: bytearray = bytearray()
+        self._scanned: int = 0
+        self._discarding: bool = False
+        self._connected: bool = False
+        self._send_lock = anyio.Lock()
 
         self.log = logging.getLogger(__name__)
 
@@ -49,6 +64,7 @@ class Socket:
         for i in reversed(range(len(sockets))):
             try:
                 self._socket = await (await anyio.connect_unix(sockets[i])).__aenter__()
+                self._connected = True
                 self.log.info(f"Connected to socket ({sockets[i]})")
                 break
             except FileNotFoundError:
@@ -69,27 +85,82 @@ class Socket:
 
     async def __aexit__(self, *excinfo: Any) -> None:
         """Disconnect from the internal socket."""
-        await self.send({"type": "unsubscribe", "account": self._username,
-                         "version": "v1"})
-        self.log.info(f"Bot attempted to unsubscribe to +********{self._username[-3:]}")
+        if self._connected:
+            try:
+                await self.send({"type": "unsubscribe", "account": self._username,
+                                 "version": "v1"})
+                self.log.info(
+                    f"Bot attempted to unsubscribe to +********{self._username[-3:]}"
+                )
+            except ConnectionResetError:
+                pass
+        self._connected = False
         return await self._socket.__aexit__(*excinfo)
 
+    async def reconnect(self) -> None:
+        """Reconnect to the socket, subscribing again if this is a subscribed socket."""
+        self._connected = False
+        try:
+            await self._socket.aclose()
+        except Exception as exc:
+            self.log.debug("Closing socket before reconnect failed", exc_info=exc)
+
+        del self._buffer[:]
+        self._scanned = 0
+        self._discarding = False
+        await self.__aenter__()
+
+    def is_connected(self) -> bool:
+        """Check if the socket is connected."""
+        return self._connected
+
     async def read(self) -> AsyncIterable[bytes]:
         """Read a socket, line by line."""
-        buffer: List[bytes] = []
+        # The buffer is kept between calls, so a partial line received by
+        # one reader is completed by the next one.
+        buffer = self._buffer
         while True:
-            try:
-                char = await self._socket.receive(1)
-            except anyio.EndOfStream:
-                raise ConnectionResetError("Connection was reset")
-            if char == b"\n":
-                yield b"".join(buffer)
-                buffer = []
-            else:
-                buffer.append(char)
+            newline = buffer.find(b"\n", self._scanned)
+            if newline == -1:
+                if len(buffer) > self._max_line_size:
+                    if not self._discarding:
+                        self.log.error(f"Line exceeds maximum line size "
+                                       f"({self._max_line_size} bytes), dropped")
+                    self._discarding = True
+                    del buffer[:]
+
+                self._scanned = len(buffer)
+                try:
+                    buffer += await self._socket.receive(self.CHUNK_SIZE)
+                except (anyio.EndOfStream, anyio.BrokenResourceError):
+                    self._connected = False
+                    raise ConnectionResetError("Connection was reset")
+                continue
+
+            # Consume the line before yielding, the caller may stop iterating.
+            with memoryview(buffer) as view:
+                line = view[:newline].tobytes()
+            del buffer[:newline + 1]
+            self._scanned = 0
+
+            if self._discarding:
+                self._discarding = False
+                continue
+            if len(line) > self._max_line_size:
+                self.log.error(f"Line exceeds maximum line size "
+                               f"({self._max_line_size} bytes), dropped")
+                continue
+
+            yield line
 
     async def send(self, message: dict) -> None:
         """Send message to socket."""
-        serialized = json.dumps(message)
-        self.log.debug(f"Socket send: {serialized}")
-        await self._socket.send(serialized.encode("utf8") + b"\n")
+        serialized = self._codec.encode(message)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f"Socket send: {serialized.decode()}")
+        try:
+            async with self._send_lock:
+                await self._socket.send(serialized + b"\n")
+        except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+            self._connected = False
+            raise ConnectionResetError("Connection was reset")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an object that represents a pool of signald sockets."""
+import logging
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+
+from .json_codec import JsonCodec
+from .socket import Socket
+
+
+class SocketPool:
+    """This object represents a pool of signald sockets for outbound traffic.
+
+    The pool grows up to max_size sockets when all sockets are busy and
+    shrinks back to min_size by closing sockets idle for idle_timeout seconds.
+    """
+
+    def __init__(self,
+                 username: str,
+                 socket_path: Optional[str] = None,
+                 min_size: int = 1,
+                 max_size: int = 4,
+                 max_line_size: int = Socket.MAX_LINE_SIZE,
+                 codec: Optional[JsonCodec] = None,
+                 idle_timeout: float = 30.0) -> None:
+        """Initialize socket pool."""
+        if min_size < 1 or max_size < min_size:
+            raise ValueError("Pool sizes must satisfy 1 <= min_size <= max_size")
+
+        self._username: str = username
+        self._socket_path: Optional[str] = socket_path
+        self._min_size: int = min_size
+        self._max_size: int = max_size
+        self._max_line_size: int = max_line_size
+        self._codec: Optional[JsonCodec] = codec
+        self._idle_timeout: float = idle_timeout
+        self._sockets: List[Socket] = []
+        self._leases: Dict[Socket, int] = {}
+        self._idle_since: Dict[Socket, float] = {}
+        self._connect_lock = anyio.Lock()
+        self._connect_handler: Optional[Callable[[Socket], Awaitable[None]]] = None
+        self._discard_handler: Optional[Callable[[Socket], None]] = None
+
+        self.log = logging.getLogger(__name__)
+
+    async def __aenter__(self) -> 'SocketPool':
+        """Open the minimum number of sockets."""
+        while len(self._sockets) < self._min_size:
+            await self._connect()
+        return self
+
+    async def __aexit__(self, *excinfo: Any) -> None:
+        """Close all sockets in the pool."""
+        while self._sockets:
+            await self.discard(self._sockets[-1])
+
+    def set_connect_handler(self, func: Callable[[Socket], Awaitable[None]]) -> None:
+        """Set a handler that is called for every newly connected socket."""
+        self._connect_handler = func
+
+    def set_discard_handler(self, func: Callable[[Socket], None]) -> None:
+        """Set a handler that is called for every socket before it is closed."""
+        self._discard_handler = func
+
+    def size(self) -> int:
+        """Get the number of sockets in the pool."""
+        return len(self._sockets)
+
+    async def _connect(self) -> Socket:
+        """Open a new socket and add it to the pool."""
+        socket = await Socket(self._username,
+                              self._socket_path,
+                              False,
+                              self._max_line_size,
+                              self._codec).__aenter__()
+        self._sockets.append(socket)
+        self._leases[socket] = 0
+        self._idle_since[socket] = monotonic()
+        self.log.info(f"Socket pool opened connection ({len(self._sockets)} open)")
+
+        if self._connect_handler:
+            await self._connect_handler(socket)
+        return socket
+
+    async def discard(self, socket: Socket) -> None:
+        """Remove a socket from the pool and close it."""
+        if socket not in self._leases:
+            return
+
+        self._sockets.remove(socket)
+        del self._leases[socket]
+        self._idle_since.pop(socket, None)
+        if self._discard_handler:
+            self._discard_handler(socket)
+        try:
+            await socket.__aexit__(None, None, None)
+        except Exception as exc:
+            self.log.debug("Closing socket failed", exc_info=exc)
+        self.log.info(f"Socket pool closed connection ({len(self._sockets)} open)")
+
+    async def _check_health(self) -> None:
+        """Replace broken sockets and keep the minimum number of sockets open."""
+        for socket in [s for s in self._sockets if not s.is_connected()]:
+            self.log.warning("Socket pool found broken connection, replacing it")
+            await self.discard(socket)
+
+        while len(self._sockets) < self._min_size:
+            await self._connect()
+
+    async def _shrink(self) -> None:
+        """Close sockets idle for longer than the idle timeout, down to min_size."""
+        now = monotonic()
+        for socket in list(self._sockets):
+            if len(self._sockets) <= self._min_size:
+                break
+            if not self._leases[socket] and \
+                    now - self._idle_since[socket] >= self._idle_timeout:
+                self.log.debug("Socket pool closing idle connection")
+                await self.discard(socket)
+
+    async def _acquire(self) -> Socket:
+        """Get the least busy socket, opening a new one when all are busy."""
+        async with self._connect_lock:
+            await self._check_health()
+            await self._shrink()
+
+            socket = min(self._sockets, key=lambda s: self._leases[s])
+            if self._leases[socket] and len(self._sockets) < self._max_size:
+                try:
+                    socket = await self._connect()
+                except OSError as exc:
+                    self.log.warning("Socket pool could not grow", exc_info=exc)
+            return socket
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Socket]:
+        """Lease a socket from the pool for the duration of a request."""
+        socket = await self._acquire()
+        self._leases[socket] += 1
+        try:
+            yield socket
+        finally:
+            if socket in self._leases:
+                self._leases[socket] -= 1
+                if not self._leases[socket]:
+                    self._idle_since[socket] = monotonic()
+                    if len(self._sockets) > self._min_size:
+                        with anyio.CancelScope(shield=True):
+                            async with self._connect_lock:
+                                await self._shrink()
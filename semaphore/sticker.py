@@ -26,7 +26,7 @@ if TYPE_CHECKING:
     from .sticker_pack import StickerPack
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class Sticker:
     """This object represents a Signal sticker."""
 
@@ -26,7 +26,7 @@ if TYPE_CHECKING:
     from .sticker import Sticker
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class StickerPack:
     """This object represents a Signal sticker pack."""
 
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+#
+# Semaphore: A simple (rule-based) bot library for Signal Private Messenger.
+# Copyright (C) 2020-2023 Lazlo Westerhof <semaphore@lazlo.me>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains a hierarchical timing wheel for the job queue."""
+from __future__ import annotations
+
+from time import time
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import anyio
+from anyio import WouldBlock
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+class _Bucket(Dict['Job', float]):
+    """Bucket of a timing wheel, maps items to their priority."""
+
+    __slots__ = ('level', 'slot', 'peak')
+
+    def __init__(self, level: int, slot: int) -> None:
+        super().__init__()
+        self.level = level
+        self.slot = slot
+        self.peak = 0
+
+
+class TimingWheel:
+    """Hierarchical timing wheel with the interface of the PriorityQueue.
+
+    Timers are put in buckets of ticks. Level 0 has a bucket per tick, every
+    next level has buckets spanning all buckets of the level below. A timer is
+    put on the lowest level that shares its window with the cursor. The cursor
+    follows the clock and cascades buckets of higher levels down when it
+    reaches them. Inserting and removing a timer are O(1).
+    """
+
+    # Number of bits of the tick per level, each level has 2 ** LEVEL_BITS buckets.
+    LEVEL_BITS: int = 8
+
+    # Dicts are rebuilt when shrunk to half of their peak size, because Python
+    # dicts never give back the memory of removed items.
+    SHRINK_SIZE: int = 1024
+
+    def __init__(self,
+                 resolution: float = 0.01,
+                 clock: Callable[[], float] = time) -> None:
+        """Initialize timing wheel."""
+        self._resolution: float = resolution
+        self._clock: Callable[[], float] = clock
+        self._head_changed = anyio.Event()
+        self._cursor: int = 0
+        self._levels: List[Dict[int, _Bucket]] = []
+        self._occupied: List[int] = []
+        self._index: Dict[Job, _Bucket] = {}
+        self._peak: int = 0
+        self._head: Optional[Tuple[float, Job]] = None
+
+    def __len__(self) -> int:
+        """Return the number of items in the wheel."""
+        return len(self._index)
+
+    def _place(self, prio: float, item: Job) -> None:
+        """Put an item in the bucket of its tick relative to the cursor."""
+        cursor = self._cursor
+        tick = int(prio / self._resolution)
+        if tick > cursor:
+            level = ((tick ^ cursor).bit_length() - 1) // self.LEVEL_BITS
+        else:
+            tick = cursor
+            level = 0
+
+        while len(self._levels) <= level:
+            self._levels.append({})
+            self._occupied.append(0)
+
+        slot = (tick >> (level * self.LEVEL_BITS)) & ((1 << self.LEVEL_BITS) - 1)
+        bucket = self._levels[level].get(slot)
+        if bucket is None:
+            bucket = self._levels[level][slot] = _Bucket(level, slot)
+            self._occupied[level] |= 1 << slot
+        bucket[item] = prio
+        self._index[item] = bucket
+        if len(bucket) > bucket.peak:
+            bucket.peak = len(bucket)
+        if len(self._index) > self._peak:
+            self._peak = len(self._index)
+
+    def _unlink(self, item: Job) -> float:
+        """Remove an item from its bucket and return its priority."""
+        bucket = self._index.pop(item)
+        prio = bucket.pop(item)
+        if not bucket:
+            del self._levels[bucket.level][bucket.slot]
+            self._occupied[bucket.level] &= ~(1 << bucket.slot)
+        elif bucket.peak > self.SHRINK_SIZE and len(bucket) * 2 < bucket.peak:
+            self._rebuild(bucket)
+
+        if self._peak > self.SHRINK_SIZE and len(self._index) * 2 < self._peak:
+            self._index = dict(self._index)
+            self._peak = len(self._index)
+        return prio
+
+    def _rebuild(self, bucket: _Bucket) -> None:
+        """Replace a bucket by a copy to free the memory of removed items."""
+        copy = _Bucket(bucket.level, bucket.slot)
+        copy.update(bucket)
+        copy.peak = len(copy)
+        self._levels[bucket.level][bucket.slot] = copy
+        for item in copy:
+            self._index[item] = copy
+
+    def _earliest(self) -> Tuple[int, int]:
+        """Return the level and slot of the earliest occupied bucket."""
+        # Items on a level are always later than the items on the levels below.
+        for level, occupied in enumerate(self._occupied):
+            if occupied:
+                return level, (occupied & -occupied).bit_length() - 1
+        raise WouldBlock
+
+    def _advance(self) -> None:
+        """Move the cursor towards the current time, cascading buckets it reaches."""
+        now = int(self._clock() / self._resolution)
+        while now > self._cursor:
+            try:
+                level, slot = self._earliest()
+            except WouldBlock:
+                self._cursor = now
+                return
+
+            shift = level * self.LEVEL_BITS
+            window = self._cursor >> (shift + self.LEVEL_BITS)
+            start = ((window << self.LEVEL_BITS) | slot) << shift
+            if start > now:
+                self._cursor = now
+                return
+
+            self._cursor = start
+            if level == 0:
+                return
+
+            bucket = self._levels[level].pop(slot)
+            self._occupied[level] &= ~(1 << slot)
+            for item, prio in bucket.items():
+                self._place(prio, item)
+
+    def _find_head(self) -> Tuple[float, Job]:
+        """Find the item with the lowest priority."""
+        self._advance()
+        level, slot = self._earliest()
+
+        # Buckets on level 0 hold a single tick, buckets of later levels are
+        # only searched until the cursor reaches them.
+        bucket = self._levels[level][slot]
+        item = min(bucket, key=bucket.__getitem__)
+        return bucket[item], item
+
+    async def put_nowait(self, prio: float, item: Job) -> None:
+        """Put an item into the wheel without blocking."""
+        if item in self._index:
+            self.remove(item)
+        self._place(prio, item)
+
+        if self._head is None:
+            self._head = self._find_head()
+        elif prio < self._head[0]:
+            self._head = (prio, item)
+
+        # Wake up waiters when the item is the new head of the wheel.
+        if self._head[1] is item:
+            self._head_changed.set()
+            self._head_changed = anyio.Event()
+
+    def remove(self, item: Job) -> None:
+        """Remove an item from the wheel, if it is in the wheel."""
+        if item not in self._index:
+            return
+
+        self._unlink(item)
+        if self._head is not None and self._head[1] is item:
+            self._head = None
+            self._head_changed.set()
+            self._head_changed = anyio.Event()
+
+    def peek(self) -> Tuple[float, Job]:
+        """Return the item with the lowest priority without removing it.
+
+        :raises WouldBlock: If the wheel is empty
+
+        :returns: Item from the wheel
+        """
+        if not self._index:
+            raise WouldBlock
+
+        if self._head is None:
+            self._head = self._find_head()
+        return self._head
+
+    def get_nowait(self) -> Tuple[float, Job]:
+        """Remove and return an item if one is immediately available.
+
+        :raises WouldBlock: If no item is immediately available
+
+        :returns: Item from the wheel
+        """
+        if not self._index:
+            raise WouldBlock
+
+        prio, item = self.peek()
+        self._unlink(item)
+        self._head = None
+        return prio, item
+
+    async def wait_head_changed(self) -> None:
+        """Wait until an item is put at the head of the wheel."""
+        await self._head_changed.wait()
@@ -41,15 +41,20 @@ setup(
     license=meta.__license__,
     packages=find_packages(),
     install_requires=requirements,
-    extras_require={'dev': [
-        'flake8',
-        'flake8-import-order',
-        'darglint',
-        'mypy',
-        'types-python-dateutil',
-        'sphinx',
-        'sphinx_rtd_theme',
-    ]},
+    extras_require={
+        'orjson': [
+            'orjson',
+        ],
+        'dev': [
+            'flake8',
+            'flake8-import-order',
+            'darglint',
+            'mypy',
+            'types-python-dateutil',
+            'sphinx',
+            'sphinx_rtd_theme',
+        ],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',